@@ -1,9 +1,22 @@
-from .config import Config
+import os
+from .cache import ExtractorCache
+from .config import Config, ConfigError
 from .core import MultiDL
+from .jobs import JobQueue
+from .profiling import PROFILER
+from .services.helpers import ORDER_POLICIES, DownloadOptions, DownloadTaskSchema
+from .services.library import Library
+from .services.mirror import Mirror
+from .services.plan import Plan
+from .services.sinks import open_sink
 from .services.spotify import Credentials
-from .term import ConfigPanel, MultiDLInfo, Print
+from .services.worker import Worker
+from .term import ConfigPanel, InfoTable, MultiDLInfo, Print, use_stderr
+from .utils import QUALITY_PROFILES, Quality
+from rich.filesize import decimal
+from rich.markup import escape
 from trogon.typer import init_tui
-from typer import Argument, Exit, Option, Typer
+from typer import Argument, Context, Exit, Option, Typer
 from typing import Annotated, Literal
 
 # Typer init
@@ -12,6 +25,12 @@ app = Typer(
     pretty_exceptions_show_locals=False,
     context_settings={"help_option_names": ["-h", "--help"]},
 )
+cache_app = Typer(
+    no_args_is_help=True,
+    help="Inspect or clear the extractor cache shared by every download.",
+    context_settings={"help_option_names": ["-h", "--help"]},
+)
+app.add_typer(cache_app, name="cache")
 
 
 def version_callback(value: bool):
@@ -23,6 +42,7 @@ def version_callback(value: bool):
 
 @app.callback()
 def main(
+    ctx: Context,
     version: Annotated[
         bool,
         Option(
@@ -33,8 +53,72 @@ def main(
             help="Shows version.",
         ),
     ] = False,
+    profile: Annotated[
+        bool,
+        Option(
+            "--profile",
+            help="Profile the run: print time by stage, progress lock waits and the top functions, and dump the profile data of every thread.",
+        ),
+    ] = False,
+    profile_output: Annotated[
+        str,
+        Option("--profile-output", help="Path to dump the profile data to, e.g. for snakeviz."),
+    ] = "multidl.prof",
+    profile_top: Annotated[
+        int,
+        Option("--profile-top", min=1, help="Number of functions to list in the profile summary."),
+    ] = 25,
 ):
-    pass
+    if profile:
+        PROFILER.start(profile_output, profile_top)
+    # Parse the config once up front, unless it is the config being fixed
+    if ctx.invoked_subcommand == "config":
+        return
+    try:
+        Config().load()
+    except ConfigError as e:
+        Print.error(escape(str(e)))
+        Print.warn("Fix the config file or reset it with [cyan]multidl config --reset[/].")
+        exit(1)
+
+
+def parse_threads(threads: str | None) -> int | Literal["max"]:
+    """Parse a thread count option, defaulting to the config."""
+    threads = threads or str(Config().performance["threads"])
+    if threads != "max" and not threads.isdigit():
+        Print.error(
+            "Invalid number of threads. Use 'max' for maximum threads or a positive integer."
+        )
+        exit(1)
+    _threads = int(threads) if threads != "max" else "max"
+    if isinstance(_threads, int) and _threads < 1:
+        Print.error("Thread count must be at least 1. Using [cyan]1[/] thread instead.")
+    return _threads
+
+
+def parse_quality(
+    quality: str | None, max_height: int | None, codec: str | None, max_filesize: int | None
+) -> Quality | None:
+    """Build the quality of the quality options, or None to use the config default."""
+    if quality is None and max_height is None and codec is None and max_filesize is None:
+        return None
+    quality = quality or Config().performance["quality"]
+    if quality not in QUALITY_PROFILES:
+        Print.error(f"Invalid quality. Use one of [cyan]{', '.join(QUALITY_PROFILES)}[/].")
+        exit(1)
+    return Quality(
+        quality,
+        max_height=max_height,
+        codec=codec,
+        max_filesize=max_filesize * 1024 * 1024 if max_filesize else None,
+    )
+
+
+def check_order(order: str) -> None:
+    """Exit if a task ordering policy is unknown."""
+    if order not in ORDER_POLICIES:
+        Print.error(f"Invalid order. Use one of [cyan]{', '.join(ORDER_POLICIES)}[/].")
+        exit(1)
 
 
 @app.command()
@@ -66,32 +150,495 @@ def download(
             help="Subtitle languages to download for the video (YouTube only). Use 'all' to download all available subtitles.",
         ),
     ] = None,
+    translated_subs: Annotated[
+        bool | None,
+        Option(
+            "--translated-subs/--no-translated-subs",
+            help="Download subtitles machine-translated from another language. Defaults to \\[performance] translated-subtitles in the config.",
+            show_default=False,
+        ),
+    ] = None,
+    subtitle_requests: Annotated[
+        int | None,
+        Option(
+            "--subtitle-requests",
+            min=1,
+            help="Subtitle tracks to fetch at once, across all downloads. Defaults to \\[performance] subtitle-requests in the config.",
+            show_default=False,
+        ),
+    ] = None,
+    lookahead: Annotated[
+        int | None,
+        Option(
+            "--lookahead",
+            min=0,
+            help="Upcoming downloads to resolve while the current ones transfer, 0 to resolve each when it starts. Ignored with --low-memory. Defaults to \\[performance] lookahead in the config.",
+            show_default=False,
+        ),
+    ] = None,
     threads: Annotated[
-        str,
+        str | None,
         Option(
             "--threads",
             "-t",
-            help="Number of threads to use for downloading. Use 'max' for maximum threads.",
+            help="Number of threads to use for downloading. Use 'max' for maximum threads. Defaults to \\[performance] threads in the config.",
+            show_default=False,
+        ),
+    ] = None,
+    order: Annotated[
+        str,
+        Option(
+            "--order",
+            help="Task ordering: 'fifo', 'shortest-first' for fast early results, or 'largest-first' to cut long-tail stragglers.",
+        ),
+    ] = "fifo",
+    segments: Annotated[
+        int,
+        Option(
+            "--segments",
+            "-S",
+            min=1,
+            help="Connections per file. Splits large files into concurrent HTTP Range segments.",
+        ),
+    ] = 1,
+    segment_size: Annotated[
+        int,
+        Option("--segment-size", min=1, help="Size of each segment in MiB."),
+    ] = 10,
+    dedupe: Annotated[
+        bool,
+        Option(
+            "--dedupe/--no-dedupe",
+            help="Hardlink media that was already downloaded instead of downloading it again.",
+        ),
+    ] = True,
+    temp_dir: Annotated[
+        str | None,
+        Option(
+            "--temp-dir",
+            help="Scratch directory (e.g. local NVMe or tmpfs) for all intermediate files. Defaults to \\[performance] temp-dir in the config.",
+        ),
+    ] = None,
+    preflight: Annotated[
+        bool,
+        Option(
+            "--preflight/--no-preflight",
+            help="Check free disk space against the estimated download size before starting. Skipped for playlists, albums, artists and channels, whose tasks are built as they download.",
+        ),
+    ] = True,
+    verify: Annotated[
+        bool,
+        Option("--verify", help="Verify every downloaded file with ffprobe."),
+    ] = False,
+    low_memory: Annotated[
+        bool,
+        Option(
+            "--low-memory",
+            help="Bounded-memory mode: keep only the info needed to download and report peak memory.",
         ),
-    ] = "5",
+    ] = False,
+    max_resolved: Annotated[
+        int,
+        Option(
+            "--max-resolved",
+            min=1,
+            help="With --low-memory, the most tasks that may hold resolved info before downloading.",
+        ),
+    ] = 2,
+    quality: Annotated[
+        str | None,
+        Option(
+            "--quality",
+            "--profile-quality",
+            help="Speed-vs-quality profile: 'fast' for progressive single files without merging, 'balanced' for up to 1080p remuxed without transcoding, 'best' for the highest quality. Defaults to \\[performance] quality in the config.",
+            show_default=False,
+        ),
+    ] = None,
+    max_height: Annotated[
+        int | None,
+        Option("--max-height", min=1, help="Highest video height, e.g. 720.", show_default=False),
+    ] = None,
+    codec: Annotated[
+        str | None,
+        Option(
+            "--codec",
+            help="Codec the video (or the audio, with --audio) must have, e.g. avc1, vp9, av01, mp4a or opus.",
+            show_default=False,
+        ),
+    ] = None,
+    max_filesize: Annotated[
+        int | None,
+        Option(
+            "--max-filesize",
+            min=1,
+            help="Largest file size in MiB. Formats of unknown size are allowed.",
+            show_default=False,
+        ),
+    ] = None,
+    stall_timeout: Annotated[
+        int | None,
+        Option(
+            "--stall-timeout",
+            min=0,
+            help="Seconds without progress before a download is aborted and requeued, 0 to never. Defaults to \\[performance] stall-timeout in the config.",
+            show_default=False,
+        ),
+    ] = None,
+    min_rate: Annotated[
+        int | None,
+        Option(
+            "--min-rate",
+            min=0,
+            help="Minimum rate in KiB/s. Downloads taking longer than their size at this rate are aborted and requeued. Defaults to \\[performance] min-rate in the config.",
+            show_default=False,
+        ),
+    ] = None,
+    queue: Annotated[
+        str | None,
+        Option(
+            "--queue",
+            "-q",
+            help="Publish tasks to a shared job queue (SQLite file) instead of downloading them.",
+        ),
+    ] = None,
+    output: Annotated[
+        str | None,
+        Option(
+            "--output",
+            "-o",
+            help="Directory to download to, 's3://bucket/prefix' to upload to S3 (or MinIO via AWS_ENDPOINT_URL), or '-' to stream a single item to stdout as it downloads, e.g. into a transcoder.",
+            show_default=False,
+        ),
+    ] = None,
+    scratch_limit: Annotated[
+        int,
+        Option(
+            "--scratch-limit",
+            min=0,
+            help="With an S3 output, the most MiB staged locally before downloads wait for uploads, 0 for no limit.",
+        ),
+    ] = 4096,
 ):
     """Download any media via link, keywords etc..."""
-    _threads: int | Literal["max"]
-    if threads != "max" and not threads.isdigit():
-        Print.error(
-            "Invalid number of threads. Use 'max' for maximum threads or a positive integer."
-        )
+    _threads = parse_threads(threads)
+    check_order(order)
+    stream = output == "-"
+    if output is not None and queue:
+        Print.error("Queued tasks are downloaded by the workers, they can't have an output.")
         exit(1)
-    _threads = int(threads) if threads != "max" else "max"
-    if isinstance(_threads, int) and int(threads) < 1:
-        Print.error("Thread count must be at least 1. Using [cyan]1[/] thread instead.")
+    if output and output.startswith("s3://") and verify:
+        Print.error("Files uploaded to S3 can't be verified.")
+        exit(1)
+    if stream:
+        use_stderr()
+    options = DownloadOptions.from_config(
+        queue=queue,
+        order=order,
+        segments=segments,
+        segment_size=segment_size * 1024 * 1024,
+        dedupe=dedupe,
+        temp_dir=temp_dir,
+        preflight=preflight,
+        verify=verify,
+        low_memory=low_memory,
+        max_resolved=max_resolved,
+        stall_timeout=stall_timeout,
+        min_rate=min_rate * 1024 if min_rate is not None else None,
+        quality=parse_quality(quality, max_height, codec, max_filesize),
+        subtitle_requests=subtitle_requests,
+        translated_subtitles=translated_subs,
+        lookahead=lookahead,
+        stream=stream,
+    )
+    if not stream:
+        options.sink = open_sink(output, options.temp_dir, scratch_limit * 1024 * 1024)
     MultiDL(query).download(
         type="audio" if audio else "video" if video else "default",
         subtitles=subtitles,
         threads=_threads,
+        options=options,
     )
 
 
+@app.command()
+def plan(
+    queries: Annotated[list[str], Argument(..., help="URLs or keywords to plan downloads for.")],
+    output: Annotated[
+        str, Option("--output", "-o", help="Path to write the plan to.")
+    ] = "plan.json",
+    audio: Annotated[
+        bool, Option("--audio", "-a", help="Download audio only (YouTube only).")
+    ] = False,
+    video: Annotated[
+        bool, Option("--video", "-v", help="Download video only (YouTube only).")
+    ] = False,
+    subtitles: Annotated[
+        list[str] | None,
+        Option("--subtitles", "-s", help="Subtitle languages to download (YouTube only)."),
+    ] = None,
+    threads: Annotated[
+        int,
+        Option("--threads", "-t", min=1, help="Number of search queries to resolve at once."),
+    ] = 8,
+    quality: Annotated[
+        str | None,
+        Option(
+            "--quality",
+            "--profile-quality",
+            help="Speed-vs-quality profile: 'fast' for progressive single files without merging, 'balanced' for up to 1080p remuxed without transcoding, 'best' for the highest quality. Defaults to \\[performance] quality in the config.",
+            show_default=False,
+        ),
+    ] = None,
+    max_height: Annotated[
+        int | None,
+        Option("--max-height", min=1, help="Highest video height, e.g. 720.", show_default=False),
+    ] = None,
+    codec: Annotated[
+        str | None,
+        Option(
+            "--codec",
+            help="Codec the video (or the audio, with --audio) must have, e.g. avc1, vp9, av01, mp4a or opus.",
+            show_default=False,
+        ),
+    ] = None,
+    max_filesize: Annotated[
+        int | None,
+        Option(
+            "--max-filesize",
+            min=1,
+            help="Largest file size in MiB. Formats of unknown size are allowed.",
+            show_default=False,
+        ),
+    ] = None,
+):
+    """Resolve what to download into a plan file, without downloading anything."""
+    _quality = parse_quality(quality, max_height, codec, max_filesize)
+    tasks: list[DownloadTaskSchema] = []
+    for query in queries:
+        MultiDL(query).download(
+            type="audio" if audio else "video" if video else "default",
+            subtitles=subtitles,
+            options=DownloadOptions(plan=tasks),
+        )
+    plan = Plan(tasks, queries, _quality or DownloadOptions.from_config().quality)
+    unresolved = plan.resolve(threads)
+    plan.save(output)
+    plan.print()
+    if unresolved:
+        Print.warn(f"[cyan]{unresolved}[/] search queries had no result and are searched at run.")
+    Print.success(f"Wrote the plan to [cyan]{output}[/]")
+
+
+@app.command()
+def run(
+    plan: Annotated[str, Argument(..., help="Path to a plan written by 'multidl plan'.")],
+    threads: Annotated[
+        str | None,
+        Option(
+            "--threads",
+            "-t",
+            help="Number of threads to use for downloading. Use 'max' for maximum threads. Defaults to \\[performance] threads in the config.",
+            show_default=False,
+        ),
+    ] = None,
+    order: Annotated[
+        str,
+        Option("--order", help="Task ordering: 'fifo', 'shortest-first' or 'largest-first'."),
+    ] = "fifo",
+    temp_dir: Annotated[
+        str | None,
+        Option("--temp-dir", help="Scratch directory for all intermediate files."),
+    ] = None,
+    verify: Annotated[
+        bool,
+        Option("--verify", help="Verify every downloaded file with ffprobe."),
+    ] = False,
+    queue: Annotated[
+        str | None,
+        Option("--queue", "-q", help="Publish the plan to a shared job queue instead."),
+    ] = None,
+):
+    """Download the tasks of a plan file."""
+    _threads = parse_threads(threads)
+    check_order(order)
+    MultiDL()
+    Plan.load(plan).run(
+        threads=_threads,
+        options=DownloadOptions.from_config(
+            order=order, temp_dir=temp_dir, verify=verify, queue=queue
+        ),
+    )
+
+
+@app.command()
+def mirror(
+    url: Annotated[str, Argument(..., help="YouTube or Spotify playlist link to mirror.")],
+    dir: Annotated[str, Argument(..., help="Directory to mirror the playlist into.")],
+    prune: Annotated[
+        bool,
+        Option("--prune", "-p", help="Delete the files of entries removed from the playlist."),
+    ] = False,
+    full: Annotated[
+        bool,
+        Option(
+            "--full",
+            help="Enumerate the playlist even if it is unchanged, retrying failed entries.",
+        ),
+    ] = False,
+    audio: Annotated[
+        bool, Option("--audio", "-a", help="Download audio only (YouTube only).")
+    ] = False,
+    video: Annotated[
+        bool, Option("--video", "-v", help="Download video only (YouTube only).")
+    ] = False,
+    subtitles: Annotated[
+        list[str] | None,
+        Option("--subtitles", "-s", help="Subtitle languages to download (YouTube only)."),
+    ] = None,
+    threads: Annotated[
+        str | None,
+        Option(
+            "--threads",
+            "-t",
+            help="Number of threads to use for downloading. Use 'max' for maximum threads. Defaults to \\[performance] threads in the config.",
+            show_default=False,
+        ),
+    ] = None,
+    verify: Annotated[
+        bool,
+        Option("--verify", help="Verify every downloaded file with ffprobe."),
+    ] = False,
+):
+    """Keep a directory in sync with a playlist, downloading only what changed."""
+    _threads = parse_threads(threads)
+    query = MultiDL(url).query
+    Mirror(str(query), dir, prune).sync(
+        type="audio" if audio else "video" if video else "default",
+        subtitles=subtitles,
+        threads=_threads,
+        options=DownloadOptions.from_config(verify=verify),
+        full=full,
+    )
+
+
+@app.command("verify")
+def verify_library(
+    dir: Annotated[str, Argument(..., help="Library directory to verify.")],
+    threads: Annotated[
+        int,
+        Option("--threads", "-t", min=1, help="Number of files to verify at once."),
+    ] = 4,
+    requeue: Annotated[
+        bool,
+        Option("--requeue", "-r", help="Download files that fail verification again."),
+    ] = False,
+    queue: Annotated[
+        str | None,
+        Option("--queue", "-q", help="Publish the re-downloads to a shared job queue."),
+    ] = None,
+):
+    """Verify downloaded media with ffprobe."""
+    MultiDL()
+    Library(dir, threads).verify(requeue=requeue, queue=queue)
+
+
+@app.command()
+def retag(
+    dir: Annotated[str, Argument(..., help="Library directory to retag.")],
+    from_spotify: Annotated[
+        str | None,
+        Option(
+            "--from-spotify",
+            help="Spotify playlist or album URL to take the tags and covers from, matched by title.",
+        ),
+    ] = None,
+    from_archive: Annotated[
+        bool,
+        Option("--from-archive", help="Take the title, artist and album from the archive."),
+    ] = False,
+    threads: Annotated[
+        int | None,
+        Option(
+            "--threads",
+            "-t",
+            min=1,
+            help="Number of processes retagging files at once. Defaults to the number of CPUs.",
+            show_default=False,
+        ),
+    ] = None,
+):
+    """Update the tags and cover art of downloaded media in place."""
+    if (from_spotify is None) == from_archive:
+        Print.error("Use either [cyan]--from-spotify[/] or [cyan]--from-archive[/].")
+        exit(1)
+    MultiDL()
+    Library(dir, threads or os.cpu_count() or 4).retag(spotify=from_spotify)
+
+
+@app.command()
+def worker(
+    queue: Annotated[str, Argument(..., help="Path to the shared job queue.")],
+    threads: Annotated[
+        int | None,
+        Option(
+            "--threads",
+            "-t",
+            min=1,
+            help="Number of jobs to download at once. Defaults to \\[performance] threads in the config.",
+            show_default=False,
+        ),
+    ] = None,
+    follow: Annotated[
+        bool,
+        Option("--follow", "-f", help="Keep waiting for new jobs once the queue is drained."),
+    ] = False,
+):
+    """Claim and download jobs from a shared job queue."""
+    MultiDL()
+    Worker(queue, threads=threads or Config().performance["threads"], follow=follow).run()
+
+
+@app.command()
+def jobs(
+    queue: Annotated[str, Argument(..., help="Path to the shared job queue.")],
+    requeue_failed: Annotated[
+        bool,
+        Option("--requeue-failed", "-r", help="Re-queue all failed jobs."),
+    ] = False,
+):
+    """Show the status of a shared job queue."""
+    job_queue = JobQueue(queue)
+    if requeue_failed:
+        Print.success(f"Re-queued [cyan]{job_queue.requeue_failed()}[/] failed job(s).")
+    stats = job_queue.stats()
+    data = [(status.capitalize(), str(count)) for status, count in stats.items()]
+    data.extend((f"Failed: {title}", error) for title, error in job_queue.failures())
+    InfoTable("Job Queue", data).print()
+
+
+@cache_app.command("stats")
+def cache_stats():
+    """Show what the extractor cache holds."""
+    cache = ExtractorCache(DownloadOptions.from_config().cache_dir)
+    data = [("Directory", cache.dir), ("Warm", "Yes" if cache.warm else "No")]
+    data.extend(
+        (section, f"{files} file(s), {decimal(size)}")
+        for section, (files, size) in sorted(cache.stats().items())
+    )
+    InfoTable("Extractor Cache", data).print()
+
+
+@cache_app.command("clear")
+def cache_clear():
+    """Remove everything from the extractor cache."""
+    cache = ExtractorCache(DownloadOptions.from_config().cache_dir)
+    if not os.path.isdir(cache.dir):
+        Print.warn("The extractor cache is empty.")
+        exit(0)
+    files, size = cache.clear()
+    Print.success(f"Removed [cyan]{files}[/] file(s), [cyan]{decimal(size)}[/] from the cache.")
+
+
 @app.command()
 def config(
     accept_spotify_tos: Annotated[
@@ -0,0 +1,178 @@
+import os
+import sqlite3
+import time
+from .config import DEFAULT_ARCHIVE_PATH
+from collections.abc import Hashable, Iterable, Iterator
+from contextlib import contextmanager
+from threading import Event, Lock
+from typing import NotRequired, TypedDict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    video_id TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    path TEXT NOT NULL,
+    url TEXT,
+    title TEXT,
+    artist TEXT,
+    album TEXT,
+    duration REAL,
+    checksum TEXT,
+    updated REAL NOT NULL,
+    PRIMARY KEY (video_id, profile)
+);
+CREATE INDEX IF NOT EXISTS media_path ON media (path);
+"""
+
+
+class MediaSchema(TypedDict):
+    video_id: str
+    profile: str
+    path: str
+    url: str
+    title: str
+    artist: str
+    album: str
+    duration: NotRequired[float | None]
+    checksum: NotRequired[str | None]
+
+
+class Archive:
+    """
+    Global index of downloaded media keyed by video ID and format profile.
+
+    Parameters:
+        path: Path to the archive database.
+    """
+
+    def __init__(self, path: str = DEFAULT_ARCHIVE_PATH):
+        self.path = os.path.abspath(path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection and commit the block."""
+        db = sqlite3.connect(self.path, timeout=60)
+        db.row_factory = sqlite3.Row
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def lookup(self, video_id: str, profile: str) -> MediaSchema | None:
+        """
+        Look up a downloaded file whose path still exists.
+
+        Parameters:
+            video_id: ID of the video.
+            profile: Format profile the file was downloaded with.
+        """
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT * FROM media WHERE video_id = ? AND profile = ?", (video_id, profile)
+            ).fetchone()
+        if row is None or not os.path.isfile(row["path"]):
+            return None
+        return dict(row)  # type: ignore
+
+    def find(self, path: str) -> MediaSchema | None:
+        """
+        Find the archive entry of a file.
+
+        Parameters:
+            path: Path of the file.
+        """
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT * FROM media WHERE path = ?", (os.path.abspath(path),)
+            ).fetchone()
+        return dict(row) if row else None  # type: ignore
+
+    def under(self, dir: str) -> list[MediaSchema]:
+        """
+        Get the archive entries of all files in a directory, recursively.
+
+        Parameters:
+            dir: Path of the directory.
+        """
+        prefix = os.path.join(os.path.abspath(dir), "")
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT * FROM media WHERE substr(path, 1, ?) = ?", (len(prefix), prefix)
+            ).fetchall()
+        return [dict(row) for row in rows]  # type: ignore
+
+    def record(self, media: MediaSchema) -> None:
+        """
+        Record a downloaded file.
+
+        Parameters:
+            media: The media to record.
+        """
+        path = os.path.abspath(media["path"])
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO media "
+                "(video_id, profile, path, url, title, artist, album, duration, checksum, updated) "
+                "VALUES (:video_id, :profile, :path, :url, :title, :artist, :album, :duration, "
+                ":checksum, :updated)",
+                {"duration": None, "checksum": None, **media, "path": path, "updated": time.time()},
+            )
+
+    def set_checksum(self, path: str, checksum: str) -> None:
+        """
+        Record the checksum of a downloaded file.
+
+        Parameters:
+            path: Path of the file.
+            checksum: SHA-256 checksum of the file.
+        """
+        with self._connect() as db:
+            db.execute(
+                "UPDATE media SET checksum = ? WHERE path = ?", (checksum, os.path.abspath(path))
+            )
+
+    def set_tags(self, tags: Iterable[tuple[str, str, str, str]]) -> None:
+        """
+        Record the retagged title, artist and album of files.
+
+        Parameters:
+            tags: Path, title, artist and album of each file. Empty values are left unchanged.
+        """
+        with self._connect() as db:
+            db.executemany(
+                "UPDATE media SET title = coalesce(nullif(?, ''), title), "
+                "artist = coalesce(nullif(?, ''), artist), album = coalesce(nullif(?, ''), album) "
+                "WHERE path = ?",
+                (
+                    (title, artist, album, os.path.abspath(path))
+                    for path, title, artist, album in tags
+                ),
+            )
+
+
+class SingleFlight:
+    """Lets only one thread at a time run the block for a key. Other threads wait their turn."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.calls: dict[Hashable, Event] = {}
+
+    @contextmanager
+    def __call__(self, key: Hashable) -> Iterator[None]:
+        while True:
+            with self.lock:
+                event = self.calls.get(key)
+                if event is None:
+                    event = self.calls[key] = Event()
+                    break
+            event.wait()
+        try:
+            yield
+        finally:
+            with self.lock:
+                del self.calls[key]
+            event.set()
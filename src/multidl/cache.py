@@ -0,0 +1,137 @@
+import os
+import shutil
+import time
+from .config import DEFAULT_EXTRACTOR_CACHE
+from collections.abc import Iterator
+from contextlib import contextmanager
+from threading import Lock
+from yt_dlp.version import __version__ as YT_DLP_VERSION
+
+# Written once the cache is populated, holding the yt-dlp version that populated it
+STAMP = ".warm"
+LOCK = ".lock"
+
+# Seconds a populated cache is trusted for. YouTube rotates its player code every few days.
+WARM_TTL = 24 * 60 * 60
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """
+    Hold an exclusive lock on a file, across processes.
+
+    Parameters:
+        path: Path of the lock file, created if missing.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+
+            f.seek(0)
+            while True:
+                try:
+                    # Retries for about 10 seconds before raising
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class ExtractorCache:
+    """
+    Cache directory of yt-dlp, shared by every download, worker and process of multidl.
+
+    yt-dlp keeps the YouTube player code and its solved signature challenges there. A cold cache
+    is populated by a single extraction while every other thread and process waits on its lock,
+    instead of each of them fetching and solving the same player at once.
+
+    Parameters:
+        dir: Cache directory.
+    """
+
+    # Serialises the threads of this process, the file lock serialises the processes
+    lock = Lock()
+
+    def __init__(self, dir: str = DEFAULT_EXTRACTOR_CACHE):
+        self.dir = os.path.abspath(dir)
+
+    @property
+    def warm(self) -> bool:
+        """Whether the cache was populated by this yt-dlp version within `WARM_TTL`."""
+        path = os.path.join(self.dir, STAMP)
+        try:
+            with open(path) as f:
+                version = f.read().strip()
+            age = time.time() - os.path.getmtime(path)
+        except OSError:
+            return False
+        return version == YT_DLP_VERSION and age < WARM_TTL
+
+    @contextmanager
+    def populating(self) -> Iterator[bool]:
+        """
+        Hold the cache locked across threads and processes while it is populated.
+
+        Yields whether the cache is still cold once the lock is held. Call `mark` once populated.
+        """
+        with self.lock, file_lock(os.path.join(self.dir, LOCK)):
+            yield not self.warm
+
+    def mark(self) -> None:
+        """Mark the cache as populated."""
+        with open(os.path.join(self.dir, STAMP), "w") as f:
+            f.write(YT_DLP_VERSION)
+
+    def stats(self) -> dict[str, tuple[int, int]]:
+        """Get the number of files and bytes cached in each section."""
+        sections: dict[str, tuple[int, int]] = {}
+        if not os.path.isdir(self.dir):
+            return sections
+        for entry in os.scandir(self.dir):
+            if not entry.is_dir():
+                continue
+            files = size = 0
+            for root, _, names in os.walk(entry.path):
+                for name in names:
+                    try:
+                        size += os.path.getsize(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    files += 1
+            sections[entry.name] = (files, size)
+        return sections
+
+    def clear(self) -> tuple[int, int]:
+        """
+        Remove every cached file. The lock file is kept for processes waiting on it.
+
+        Returns:
+            Number of files and bytes removed.
+        """
+        sections = self.stats()
+        with self.lock, file_lock(os.path.join(self.dir, LOCK)):
+            for entry in os.scandir(self.dir):
+                if entry.name == LOCK:
+                    continue
+                if entry.is_dir():
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                else:
+                    os.remove(entry.path)
+        return (
+            sum(files for files, _ in sections.values()),
+            sum(size for _, size in sections.values()),
+        )
@@ -1,11 +1,18 @@
 import os
 import platformdirs
 import toml
+import tomllib
+from .utils import QUALITY_PROFILES
+from copy import deepcopy
+from threading import Lock
 from typing import TypedDict
 
 config_path = platformdirs.user_config_dir("multidl")
 DEFAULT_CONFIG_PATH = os.path.join(config_path, "config.toml")
 MULTIDL_CONFIG = os.environ.get("MULTIDL_CONFIG", DEFAULT_CONFIG_PATH)
+DEFAULT_ARCHIVE_PATH = os.path.join(platformdirs.user_data_dir("multidl"), "archive.db")
+DEFAULT_SUBTITLE_CACHE = os.path.join(platformdirs.user_cache_dir("multidl"), "subtitles")
+DEFAULT_EXTRACTOR_CACHE = os.path.join(platformdirs.user_cache_dir("multidl"), "extractor")
 
 
 Spotify = TypedDict(
@@ -16,17 +23,51 @@ Spotify = TypedDict(
     },
 )
 
+Performance = TypedDict(
+    "Performance",
+    {
+        "threads": int,
+        "rate-limit": int,
+        "cache-dir": str,
+        "temp-dir": str,
+        "postprocess-threads": int,
+        "spotify-requests": int,
+        "stall-timeout": int,
+        "min-rate": int,
+        "requeues": int,
+        "quality": str,
+        "subtitle-requests": int,
+        "translated-subtitles": bool,
+        "lookahead": int,
+    },
+)
+
 ConfigSchema = TypedDict(
     "ConfigSchema",
     {
         "spotify-credentials": Spotify,
         "spotify-tos": bool,
+        "performance": Performance,
     },
 )
 
+# Performance settings that must be at least 1, the others at least 0
+POSITIVE_SETTINGS = ("threads", "postprocess-threads", "spotify-requests", "subtitle-requests")
+
+
+class ConfigError(ValueError):
+    """Raised when the config file can't be parsed or holds an invalid value."""
+
 
 class Config:
-    """Handles the configuration for multidl."""
+    """
+    Handles the configuration for multidl.
+
+    The config file is parsed once per process and cached. Saving refreshes the cache.
+    """
+
+    cache: ConfigSchema | None = None
+    lock = Lock()
 
     def __init__(self):
         self.default_config: ConfigSchema = {
@@ -35,6 +76,21 @@ class Config:
                 "client-id": "",
                 "client-secret": "",
             },
+            "performance": {
+                "threads": 5,
+                "rate-limit": 0,
+                "cache-dir": "",
+                "temp-dir": "",
+                "postprocess-threads": 2,
+                "spotify-requests": 8,
+                "stall-timeout": 60,
+                "min-rate": 0,
+                "requeues": 2,
+                "quality": "best",
+                "subtitle-requests": 4,
+                "translated-subtitles": True,
+                "lookahead": 4,
+            },
         }
         if not os.path.exists(MULTIDL_CONFIG):
             self.create()
@@ -44,6 +100,7 @@ class Config:
         os.makedirs(os.path.dirname(MULTIDL_CONFIG), exist_ok=True)
         with open(MULTIDL_CONFIG, "a") as f:
             toml.dump(self.default_config, f)
+        Config.cache = None
 
     def reset(self) -> None:
         """Reset the config file to default values."""
@@ -51,19 +108,60 @@ class Config:
         self.create()
 
     def load(self) -> ConfigSchema:
-        """Loads config from the config file."""
-        with open(MULTIDL_CONFIG) as f:
-            config = toml.load(f)
+        """Loads config from the config file, parsing it only on first use."""
+        with Config.lock:
+            if Config.cache is None:
+                try:
+                    with open(MULTIDL_CONFIG, "rb") as f:
+                        config = tomllib.load(f)
+                except tomllib.TOMLDecodeError as e:
+                    raise ConfigError(f"Invalid config file {MULTIDL_CONFIG}: {e}") from e
+                Config.cache = self.validate(self.merge(config, deepcopy(self.default_config)))
+            # Callers modify and save what they load, so they get their own copy
+            return deepcopy(Config.cache)
+
+    @staticmethod
+    def merge(d, default) -> ConfigSchema:
+        """Fill the keys missing from a config with their defaults."""
+        for k, v in default.items():
+            if k not in d:
+                d[k] = v
+            elif isinstance(v, dict) and isinstance(d[k], dict):
+                Config.merge(d[k], v)
+        return d
+
+    def validate(self, config: ConfigSchema) -> ConfigSchema:
+        """
+        Check the types and ranges of the config values.
 
-        def merge(d, default) -> ConfigSchema:
-            for k, v in default.items():
-                if k not in d:
-                    d[k] = v
-                elif isinstance(v, dict) and isinstance(d[k], dict):
-                    merge(d[k], v)
-            return d
+        Parameters:
+            config: The config to check.
+        """
+        defaults = self.default_config["performance"]
+        for key, value in config["performance"].items():
+            if key not in defaults:
+                continue
+            expected = type(defaults[key])
+            if type(value) is not expected:
+                raise ConfigError(
+                    f"Invalid [performance] {key} in {MULTIDL_CONFIG}: "
+                    f"expected {expected.__name__}, got {value!r}"
+                )
+            if key == "quality" and value not in QUALITY_PROFILES:
+                raise ConfigError(
+                    f"Invalid [performance] quality in {MULTIDL_CONFIG}: "
+                    f"expected one of {', '.join(QUALITY_PROFILES)}, got {value!r}"
+                )
+            if isinstance(value, int) and value < (1 if key in POSITIVE_SETTINGS else 0):
+                raise ConfigError(
+                    f"Invalid [performance] {key} in {MULTIDL_CONFIG}: {value} is too small"
+                )
+        return config
 
-        return merge(config, self.default_config)
+    @property
+    def performance(self) -> Performance:
+        """The `[performance]` section of the config."""
+        return self.load()["performance"]
 
     def save(self, config: ConfigSchema) -> None:
         """
@@ -74,6 +172,8 @@ class Config:
         """
         with open(MULTIDL_CONFIG, "w") as f:
             toml.dump(config, f)
+        with Config.lock:
+            Config.cache = deepcopy(config)
 
     def set_spotify_credentials(self, client_id: str, client_secret: str) -> ConfigSchema:
         """
@@ -2,6 +2,7 @@ import inspect
 import re
 import shutil
 from . import Spotify, YouTube
+from .services.helpers import DownloadOptions
 from .term import Print
 from typing import Literal
 
@@ -82,7 +83,7 @@ class MultiDL:
             "youtube.com": (yt, ["playlist:pl", "watch:video", "channel", "/@:channel"]),
             "open.spotify.com": (
                 lambda: Spotify(self.query),  # type: ignore
-                ["album", "track", "playlist:pl", "user"],
+                ["album", "track", "playlist:pl", "user", "artist"],
             ),
         }
         if not self._dispatch_handler(handlers, formatter="info_{f}"):
@@ -96,6 +97,7 @@ class MultiDL:
         type: Literal["audio", "video", "default"] = "default",
         subtitles: list[str] | None = None,
         threads: int | Literal["max"] = 5,
+        options: DownloadOptions | None = None,
     ):
         """Download the media."""
         if not self.query:
@@ -106,7 +108,7 @@ class MultiDL:
             "youtube.com": (yt, ["playlist:pl", "watch:video", "channel", "/@:channel"]),
             "open.spotify.com": (
                 lambda: Spotify(self.query),  # type: ignore
-                ["album", "track", "playlist:pl", "user"],
+                ["album", "track", "playlist:pl", "user", "artist"],
             ),
         }
         if not self._dispatch_handler(
@@ -116,9 +118,10 @@ class MultiDL:
                 "type": type,
                 "threads": threads,
                 "subtitles": subtitles,
+                "options": options,
             },
         ):
             if self.query.startswith("http://") or self.query.startswith("https://"):
-                yt.download_video(type, subtitles, threads)
+                yt.download_video(type, subtitles, threads, options)
             else:
-                yt.download_search(type, subtitles, threads)
+                yt.download_search(type, subtitles, threads, options)
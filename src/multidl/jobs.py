@@ -0,0 +1,213 @@
+import json
+import os
+import sqlite3
+import time
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from typing import TypedDict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+"""
+
+
+class JobSchema(TypedDict):
+    id: int
+    task: dict
+    attempts: int
+
+
+class JobQueue:
+    """
+    Shared job queue backed by SQLite, with lease and heartbeat semantics.
+
+    The database may live on a disk shared by several hosts. Every state change runs in its own
+    `BEGIN IMMEDIATE` transaction, so two workers can never claim the same job.
+
+    Parameters:
+        path: Path to the queue database.
+        lease: Seconds a claimed job stays leased without a heartbeat.
+        max_attempts: Number of claims after which a failing job is given up.
+    """
+
+    def __init__(self, path: str, lease: float = 120, max_attempts: int = 3):
+        self.path = os.path.abspath(path)
+        self.lease = lease
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        db = sqlite3.connect(self.path, timeout=60)
+        try:
+            db.executescript(SCHEMA)
+        finally:
+            db.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection and run the block inside a write transaction."""
+        db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            yield db
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+
+    def publish(self, tasks: Iterable[dict]) -> int:
+        """
+        Publish tasks to the queue.
+
+        Parameters:
+            tasks: Download tasks to publish.
+
+        Returns:
+            Number of published jobs.
+        """
+        # Resolving the tasks may take a while, the queue is only locked to write them
+        rows = [json.dumps(task) for task in tasks]
+        now = time.time()
+        with self._transaction() as db:
+            cursor = db.executemany(
+                "INSERT INTO jobs (task, updated) VALUES (?, ?)", ((row, now) for row in rows)
+            )
+            return cursor.rowcount
+
+    def _expire_leases(self, db: sqlite3.Connection, now: float) -> None:
+        """Re-queue jobs whose lease expired, or fail them once out of attempts."""
+        db.execute(
+            "UPDATE jobs SET status = 'failed', worker = NULL, error = 'Lease expired', updated = ? "
+            "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+            (now, now, self.max_attempts),
+        )
+        db.execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL, updated = ? "
+            "WHERE status = 'leased' AND lease_expires < ?",
+            (now, now),
+        )
+
+    def claim(self, worker: str) -> JobSchema | None:
+        """
+        Claim the oldest queued job.
+
+        Parameters:
+            worker: Unique name of the claiming worker.
+
+        Returns:
+            The claimed job, or None if nothing is queued.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            self._expire_leases(db, now)
+            row = db.execute(
+                "SELECT id, task, attempts FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE jobs SET status = 'leased', worker = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated = ? WHERE id = ?",
+                (worker, now + self.lease, now, row["id"]),
+            )
+        return {"id": row["id"], "task": json.loads(row["task"]), "attempts": row["attempts"] + 1}
+
+    def heartbeat(self, job_id: int, worker: str) -> bool:
+        """
+        Extend the lease of a claimed job.
+
+        Parameters:
+            job_id: ID of the claimed job.
+            worker: Name of the worker holding the lease.
+
+        Returns:
+            False if the lease was lost to another worker.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET lease_expires = ?, updated = ? "
+                "WHERE id = ? AND worker = ? AND status = 'leased'",
+                (now + self.lease, now, job_id, worker),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: int, worker: str, result: str = "") -> None:
+        """
+        Mark a claimed job as done.
+
+        Parameters:
+            job_id: ID of the claimed job.
+            worker: Name of the worker holding the lease.
+            result: Result to report, e.g. the downloaded file path.
+        """
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE jobs SET status = 'done', lease_expires = NULL, result = ?, error = NULL, "
+                "updated = ? WHERE id = ? AND worker = ?",
+                (result, time.time(), job_id, worker),
+            )
+
+    def fail(self, job_id: int, worker: str, error: str) -> None:
+        """
+        Report a failed job. It is re-queued until it runs out of attempts.
+
+        Parameters:
+            job_id: ID of the claimed job.
+            worker: Name of the worker holding the lease.
+            error: Error message to report.
+        """
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+                "worker = NULL, lease_expires = NULL, error = ?, updated = ? "
+                "WHERE id = ? AND worker = ?",
+                (self.max_attempts, error, time.time(), job_id, worker),
+            )
+
+    def requeue_failed(self) -> int:
+        """Re-queue all failed jobs with a fresh attempt budget."""
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET status = 'queued', attempts = 0, updated = ? WHERE status = 'failed'",
+                (time.time(),),
+            )
+            return cursor.rowcount
+
+    def stats(self) -> dict[str, int]:
+        """Get the number of jobs in each state."""
+        with self._transaction() as db:
+            self._expire_leases(db, time.time())
+            rows = db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts: dict[str, int] = dict.fromkeys(("queued", "leased", "done", "failed"), 0)
+        counts.update({row[0]: row[1] for row in rows})
+        return counts
+
+    def failures(self, limit: int = 20) -> list[tuple[str, str]]:
+        """
+        Get the most recent failed jobs.
+
+        Parameters:
+            limit: Maximum number of failures to return.
+
+        Returns:
+            List of (task title, error) tuples.
+        """
+        with self._transaction() as db:
+            rows = db.execute(
+                "SELECT task, error FROM jobs WHERE status = 'failed' ORDER BY updated DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [(json.loads(row["task"]).get("title", ""), row["error"] or "") for row in rows]
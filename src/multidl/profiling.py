@@ -0,0 +1,219 @@
+import atexit
+import os
+import profile
+import pstats
+import sys
+import threading
+import time
+from .term import Print, ProgressBar, console
+from collections import defaultdict
+from collections.abc import Callable
+from contextlib import nullcontext
+from rich import box
+from rich.markup import escape
+from rich.table import Table
+from typing import Any
+
+NULL_STAGE = nullcontext()
+
+# Simulated frames and event handlers of the pure-Python profiler
+FAKE_FRAME = profile.Profile.fake_frame  # type: ignore
+BASE_DISPATCH: dict[str, Callable] = profile.Profile.dispatch  # type: ignore
+
+
+class Stage:
+    """Context manager adding its wall-clock time to a stage of the profiler."""
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+
+
+class TimedLock:
+    """
+    Wraps a lock, recording how long each thread waits to acquire it.
+
+    Parameters:
+        lock: The lock to wrap.
+        profiler: Profiler to record waits to.
+    """
+
+    def __init__(self, lock, profiler: "Profiler"):
+        self.lock = lock
+        self.profiler = profiler
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        start = time.perf_counter()
+        acquired = self.lock.acquire(blocking, timeout)
+        self.profiler.wait(time.perf_counter() - start)
+        return acquired
+
+    def release(self) -> None:
+        self.lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class ThreadProfile(profile.Profile):
+    """
+    Wall-clock profile of a single thread, which may start anywhere in its call stack.
+
+    cProfile hooks into `sys.monitoring` from Python 3.12, where only one profile can be active
+    in the process and the calls of every thread land on its single call stack. This profile
+    hooks `sys.setprofile`, which is per thread, so each thread can have one of its own.
+    """
+
+    # Internals of the pure-Python profiler, left out of its stubs
+    cur: Any
+    dispatcher: Callable[..., object]
+
+    def __init__(self):
+        super().__init__(time.perf_counter)
+
+    def trace_dispatch_return(self, frame, t):
+        # Frames entered before profiling started return past the first profiled frame
+        if frame is not self.cur[-2] and isinstance(self.cur[-2], FAKE_FRAME):
+            return 0
+        return BASE_DISPATCH["return"](self, frame, t)
+
+    dispatch = BASE_DISPATCH | {
+        "return": trace_dispatch_return,
+        "c_exception": trace_dispatch_return,
+        "c_return": trace_dispatch_return,
+    }
+
+
+class Profiler:
+    """
+    Process-wide profiler behind the `--profile` option.
+
+    Profiles every thread on its own, and records wall-clock time by stage and the time each
+    thread waits on the progress display lock. A summary is printed at exit and the merged
+    profiles are dumped for snakeviz or any other pstats viewer. The profiles are pure Python, so
+    CPU-bound code runs several times slower while profiling, network-bound downloads far less.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.stages: dict[str, list[float]] = defaultdict(lambda: [0.0, 0])
+        self.waits: dict[str, list[float]] = defaultdict(lambda: [0.0, 0])
+        self.profile: ThreadProfile | None = None
+        # Profiles of the threads that finished, merged into the main one at exit
+        self.profiles: list[ThreadProfile] = []
+        self.run = threading.Thread.run
+
+    def start(self, output: str = "multidl.prof", top: int = 25) -> None:
+        """
+        Start profiling until the process exits.
+
+        Parameters:
+            output: Path to dump the profile data to.
+            top: Number of functions to list in the summary.
+        """
+        self.enabled = True
+        self.output = output
+        self.top = top
+        self.started = time.perf_counter()
+        # Rich takes this lock on every progress update and on every refresh of the display
+        for progress in (ProgressBar.download, ProgressBar.playlist, ProgressBar.search):
+            progress._lock = TimedLock(progress._lock, self)  # type: ignore
+
+        def run(thread: threading.Thread) -> None:
+            self._profiled_run(thread)
+
+        threading.Thread.run = run  # type: ignore
+        self.profile = ThreadProfile()
+        sys.setprofile(self.profile.dispatcher)
+        atexit.register(self.report)
+
+    def _profiled_run(self, thread: threading.Thread) -> None:
+        """Run a thread under a profile of its own, covering every thread started from now on."""
+        thread_profile = ThreadProfile()
+        sys.setprofile(thread_profile.dispatcher)
+        try:
+            self.run(thread)
+        finally:
+            sys.setprofile(None)
+            # Closes the call that stopped profiling now rather than when the report is printed
+            thread_profile.create_stats()
+            with self.lock:
+                self.profiles.append(thread_profile)
+
+    def stage(self, name: str) -> Stage | nullcontext:
+        """
+        Time a block as part of a stage. Costs nothing while profiling is off.
+
+        Parameters:
+            name: Name of the stage.
+        """
+        return Stage(self, name) if self.enabled else NULL_STAGE
+
+    def record(self, name: str, seconds: float) -> None:
+        """
+        Add time to a stage.
+
+        Parameters:
+            name: Name of the stage.
+            seconds: Wall-clock time spent.
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            entry = self.stages[name]
+            entry[0] += seconds
+            entry[1] += 1
+
+    def wait(self, seconds: float) -> None:
+        """Add lock-wait time to the current thread."""
+        with self.lock:
+            entry = self.waits[threading.current_thread().name]
+            entry[0] += seconds
+            entry[1] += 1
+
+    def report(self) -> None:
+        """Stop profiling, print the summary and dump the merged profile data."""
+        if self.profile is None:
+            return
+        sys.setprofile(None)
+        threading.Thread.run = self.run  # type: ignore
+        elapsed = time.perf_counter() - self.started
+        stats = pstats.Stats(self.profile)
+        with self.lock:
+            # Threads still running at exit, e.g. daemon threads, are left out
+            for thread_profile in self.profiles:
+                stats.add(thread_profile)
+        stats.dump_stats(self.output)
+
+        stages = Table("Stage", "Total", "Calls", "Mean", box=box.SIMPLE, title="Stages")
+        for name, (total, calls) in sorted(self.stages.items(), key=lambda i: -i[1][0]):
+            stages.add_row(name, f"{total:.2f}s", str(calls), f"{total / calls * 1000:.1f}ms")
+        waits = Table("Thread", "Waited", "Acquires", box=box.SIMPLE, title="Progress Lock Waits")
+        for name, (total, calls) in sorted(self.waits.items(), key=lambda i: -i[1][0]):
+            waits.add_row(name, f"{total * 1000:.1f}ms", str(calls))
+        functions = Table(
+            "Function", "Calls", "Own", "Cumulative", box=box.SIMPLE, title="Top Functions"
+        )
+        rows = sorted(stats.stats.items(), key=lambda i: -i[1][3])  # type: ignore
+        for (file, line, name), (_, calls, own, cumulative, _) in rows[: self.top]:
+            where = os.path.join(*file.split(os.sep)[-2:]) if file else ""
+            functions.add_row(
+                escape(f"{name} ({where}:{line})"), str(calls), f"{own:.2f}s", f"{cumulative:.2f}s"
+            )
+        console.print(stages, waits, functions)
+        Print.success(f"Profiled [cyan]{elapsed:.1f}s[/], saved to [cyan]{self.output}[/]")
+
+
+# Shared by the whole process, so any module can time its stages
+PROFILER = Profiler()
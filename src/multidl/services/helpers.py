@@ -1,12 +1,158 @@
+import heapq
+import itertools
 import os
+import shutil
+import sys
+import tempfile
+import time
+from ..archive import Archive, SingleFlight
+from ..cache import ExtractorCache
+from ..config import DEFAULT_EXTRACTOR_CACHE, Config
+from ..jobs import JobQueue
+from ..profiling import PROFILER
 from ..term import Print, ProgressBar
-from ..utils import YTOptions
-from dataclasses import dataclass
+from ..utils import Quality, YTOptions, link_file, move_file, peak_rss, sanitize_path
+from .lookahead import Lookahead
+from .segmented import SegmentedPP
+from .sinks import LocalSink, Sink
+from .subtitles import SubtitleFetcher
+from .verify import Verifier, report
+from .watchdog import StalledError, Watchdog
+from collections.abc import Iterable, Iterator, Sequence
+from dataclasses import dataclass, field, fields
+from rich.filesize import decimal
 from rich.progress import TaskID
-from threading import Thread
-from typing import Literal, NotRequired, TypedDict
+from threading import BoundedSemaphore, Lock, Thread
+from typing import TYPE_CHECKING, Literal, cast
 from yt_dlp import YoutubeDL
 
+if TYPE_CHECKING:
+    from yt_dlp import _Params
+    from yt_dlp.extractor.common import _InfoDict
+
+
+@dataclass
+class DownloadOptions:
+    """
+    Run-wide options shared by every task of a download.
+
+    Parameters:
+        queue: Path to a shared job queue. Tasks are published there instead of being downloaded.
+        order: Task ordering policy, one of `ORDER_POLICIES`.
+        segments: Number of connections per file. Above 1, large plain HTTP formats are fetched
+            as concurrent Range segments and DASH/HLS formats as concurrent fragments.
+        segment_size: Size of each Range segment in bytes.
+        dedupe: Materialise media already in the archive as hardlinks instead of downloading it
+            again, and let concurrent duplicates wait on a single transfer.
+        temp_dir: Scratch directory for `.part`, merge and postprocessor files. Each finished file
+            is moved to its final location in one atomic step.
+        preflight: Check free disk space against the estimated size of the tasks before starting.
+            Skipped with a warning when the tasks are a lazy iterable rather than a list.
+        verify: Verify every downloaded file with ffprobe in a separate worker pool.
+        verify_threads: Number of files to verify at once.
+        low_memory: Bounded-memory mode. Info dicts are pruned to what downloading needs once a
+            format is selected, at most `max_resolved` tasks hold resolved info before they start
+            downloading, and the peak RSS of the run is reported.
+        max_resolved: Cap on resolved-but-not-started tasks in bounded-memory mode.
+        rate_limit: Maximum download rate of each file in bytes per second.
+        cache_dir: Cache directory of yt-dlp, shared by every download. A cold cache is populated
+            by a single extraction while the others wait.
+        stall_timeout: Seconds a transfer may go without new bytes before it is aborted and
+            requeued.
+        min_rate: Minimum expected rate in bytes per second. A transfer taking longer than its
+            size at this rate is aborted and requeued.
+        requeues: Number of times an aborted transfer is requeued, with exponential backoff.
+        quality: Speed-vs-quality format selection.
+        stream: Write the single downloaded item to stdout as it arrives instead of to a file.
+            Formats that need merging are muxed on the fly by ffmpeg, tagged where the container
+            supports it. Nothing is postprocessed, archived or verified.
+        subtitle_requests: Maximum number of concurrent subtitle requests, across all downloads.
+        translated_subtitles: Download subtitles machine-translated from another language.
+        lookahead: Number of upcoming tasks resolved while the current ones transfer, 0 to resolve
+            each task when its download starts. Disabled in bounded-memory mode, where entries
+            resolved ahead would be held outside the `max_resolved` cap.
+        sink: Where finished files are stored. Files stored off this machine are not archived,
+            verified or hardlinked.
+        plan: Collects the tasks instead of downloading them, to write a plan.
+    """
+
+    queue: str | None = None
+    order: str = "fifo"
+    segments: int = 1
+    segment_size: int = 10 * 1024 * 1024
+    dedupe: bool = True
+    temp_dir: str | None = None
+    preflight: bool = True
+    verify: bool = False
+    verify_threads: int = 2
+    low_memory: bool = False
+    max_resolved: int = 2
+    rate_limit: int | None = None
+    cache_dir: str = DEFAULT_EXTRACTOR_CACHE
+    stall_timeout: float | None = None
+    min_rate: int | None = None
+    requeues: int = 2
+    quality: Quality = field(default_factory=Quality)
+    stream: bool = False
+    subtitle_requests: int = 4
+    translated_subtitles: bool = True
+    lookahead: int = 4
+    sink: Sink = field(default_factory=LocalSink)
+    plan: "list[DownloadTaskSchema] | None" = None
+
+    @classmethod
+    def from_config(cls, **options) -> "DownloadOptions":
+        """
+        Create options defaulting to the `[performance]` section of the config.
+
+        Parameters:
+            options: Options to set. Options given as None keep their config default.
+        """
+        perf = Config().performance
+        defaults = {
+            "temp_dir": perf["temp-dir"] or None,
+            "rate_limit": perf["rate-limit"] or None,
+            "cache_dir": perf["cache-dir"] or DEFAULT_EXTRACTOR_CACHE,
+            "verify_threads": perf["postprocess-threads"],
+            "stall_timeout": perf["stall-timeout"] or None,
+            "min_rate": perf["min-rate"] or None,
+            "requeues": perf["requeues"],
+            "quality": Quality(perf["quality"]),
+            "subtitle_requests": perf["subtitle-requests"],
+            "translated_subtitles": perf["translated-subtitles"],
+            "lookahead": perf["lookahead"],
+        }
+        return cls(**defaults | {k: v for k, v in options.items() if v is not None})
+
+
+# Large fields of an info dict that are not needed once a format is selected
+PRUNED_FIELDS = ("formats", "automatic_captions", "subtitles", "heatmap", "_format_sort_fields")
+
+
+def prune_info(info: dict) -> dict:
+    """
+    Drop the fields of a resolved info dict that downloading and postprocessing don't need.
+
+    Parameters:
+        info: Info dict with a selected format, modified in place.
+    """
+    for key in PRUNED_FIELDS:
+        info.pop(key, None)
+    # Only the last, preferred, thumbnail is written
+    if len(info.get("thumbnails") or []) > 1:
+        info["thumbnails"] = info["thumbnails"][-1:]
+    return info
+
+
+# Seconds before a stalled task is first retried, doubled on each further requeue
+REQUEUE_BACKOFF = 5
+
+# Shared by every download of the process, so concurrent duplicates wait on one transfer
+FLIGHTS = SingleFlight()
+
+# Subtitle fetchers by request budget, shared so the budget holds across all downloads
+SUBTITLE_FETCHERS: dict[int, SubtitleFetcher] = {}
+
 
 class YTDownloader:
     """
@@ -22,6 +168,12 @@ class YTDownloader:
         artist: The artist of the media.
         subtitles: List of subtitles to download.
         progress: A progress bar to use for downloading.
+        options: Run-wide download options.
+        info: Already extracted info for the query. Skips extraction when given.
+        id: Video ID, when known before extraction.
+        slots: Limits the tasks holding resolved info that have not started downloading.
+        workdir: Scratch directory in `temp_dir` kept by the caller. A fresh one is made and
+            removed after the download when not given.
     """
 
     def __init__(
@@ -35,6 +187,11 @@ class YTDownloader:
         artist: str = "",
         subtitles: list[str] | None = None,
         progress: ProgressBar | None = None,
+        options: DownloadOptions | None = None,
+        info: dict | None = None,
+        id: str | None = None,
+        slots: BoundedSemaphore | None = None,
+        workdir: str | None = None,
     ):
         self.query = query
         self.type: Literal["audio", "video", "default"] = type
@@ -44,64 +201,300 @@ class YTDownloader:
         self.artist = artist
         self.subtitles = subtitles
         self.progress = progress
+        self.options = options or DownloadOptions()
+        self.info = info
+        self.id = id
         self.title = title
         self._title = title if len(title) < 20 else title[:20].strip() + "..."
+        self.filepath: str | None = None
+        self.workdir = workdir
+        self.duration: float | None = None
+        self.slots = slots
+        self.holding = False
+        self.finished_at: float | None = None
+        self.watchdog: Watchdog | None = None
 
-    def download(self):
+    def download(self) -> str | None:
+        """
+        Download the media.
+
+        Returns:
+            Path of the downloaded file, or None if nothing was downloaded.
+        """
         if self.progress is not None:
-            self.task = self.progress.download.add_task(
-                description=f"[yellow]Downloading[/] [cyan]{self._title}[/]",
-                total=0,
-                start=False,
-            )
-        is_url: bool = (
-            self.query.startswith("http") or self.query.startswith("www")
-        ) and "youtube" in self.query
-        yt_opts = YTOptions(
+            self.task = self.progress.add(f"[yellow]Downloading[/] [cyan]{self._title}[/]")
+        # Taken before waiting on a duplicate, so no flight holder ever waits for a slot
+        if self.slots is not None:
+            self.slots.acquire()
+            self.holding = True
+        try:
+            if self.id and self.options.dedupe and not self.options.stream:
+                with FLIGHTS((self.id, self.profile)):
+                    filepath = self._link(self.id) or self._download()
+            else:
+                filepath = self._download()
+        except StalledError:
+            if self.progress is not None and self.progress.windowed:
+                # The task is retried or counted as failed by the downloader
+                self.progress.drop(self.task)
+            elif self.progress is not None:
+                self.progress.download.update(
+                    self.task, description=f"[red]Stalled[/] [cyan]{self._title}[/]"
+                )
+                self.progress.download.stop_task(self.task)
+            raise
+        except (Exception, SystemExit):
+            if self.progress is not None and self.progress.windowed:
+                self.progress.retire(self.task, failed=True)
+            elif self.progress is not None:
+                self.progress.download.update(
+                    self.task, description=f"[red]Failed[/] [cyan]{self._title}[/]"
+                )
+                self.progress.download.stop_task(self.task)
+            raise
+        finally:
+            self._release()
+        if self.progress is not None and self.progress.windowed:
+            self.progress.retire(self.task, failed=not filepath)
+        return filepath
+
+    def _release(self):
+        """Give the resolved-task slot back once the download starts."""
+        if self.holding and self.slots is not None:
+            self.holding = False
+            self.slots.release()
+
+    @property
+    def profile(self) -> str:
+        """Format profile of the download, used to key the archive."""
+        profile = f"{self.type}:{','.join(sorted(self.subtitles or []))}"
+        return f"{profile}:{self.options.quality.key}" if self.options.quality.key else profile
+
+    def _download(self) -> str | None:
+        if not self.options.temp_dir or self.options.stream or self.workdir is not None:
+            return self._extract_and_fetch()
+        os.makedirs(self.options.temp_dir, exist_ok=True)
+        self.workdir = tempfile.mkdtemp(prefix="multidl-", dir=self.options.temp_dir)
+        try:
+            return self._extract_and_fetch()
+        finally:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+    @property
+    def watched(self) -> bool:
+        """Whether transfers are aborted when they stall or run too slow."""
+        return bool(self.options.stall_timeout or self.options.min_rate)
+
+    def _yt_opts(self) -> "_Params":
+        return YTOptions(
             type=self.type,
             subtitles=self.subtitles,
-            dir=self.playlist,
+            dir=self.options.sink.dir(self.playlist),
             filename=self.title,
             progress_hooks=[self.hook],
+            post_hooks=[self.post_hook],
+            segments=self.options.segments,
+            temp_dir=self.workdir,
+            rate_limit=self.options.rate_limit,
+            cache_dir=self.options.cache_dir,
+            retry_sleep=self.retry_sleep if self.watched else None,
+            # A hung read has to wake up, and reach the retry sleep, well within the stall timeout
+            socket_timeout=min(20, self.options.stall_timeout / 2)
+            if self.options.stall_timeout
+            else None,
+            quality=self.options.quality,
+            stream=self.options.stream,
         ).get()
-        with YoutubeDL(yt_opts) as ydl:
+
+    def _extract(self, ydl: YoutubeDL) -> dict | None:
+        """Extract the entry and select its formats, or get None if there are no results."""
+        # Searches go to YouTube as well
+        if "youtu" not in self.query and self.query.startswith(("http://", "https://")):
+            return self._extract_entry(ydl)
+        cache = ExtractorCache(self.options.cache_dir)
+        if not cache.warm:
+            with cache.populating() as cold:
+                if cold:
+                    entry = self._extract_entry(ydl)
+                    if entry:
+                        cache.mark()
+                    return entry
+        return self._extract_entry(ydl)
+
+    def _extract_entry(self, ydl: YoutubeDL) -> dict | None:
+        is_url: bool = (
+            self.query.startswith("http") or self.query.startswith("www")
+        ) and "youtube" in self.query
+        extracting = time.perf_counter()
+        if self.info is not None:
+            yt = ydl.process_ie_result(cast("_InfoDict", self.info), download=False)
+            self.info = None
+        else:
             yt = ydl.extract_info(
                 # Checking url here adds support for non-YouTube URLs. Custom sources have dedicated downloaders.
                 f"{'' if self.query.startswith('http://') or self.query.startswith('https://') else 'ytsearch:'}{self.query}"
                 if not is_url
-                else self.query
+                else self.query,
+                download=False,
             )
+        PROFILER.record("extract", time.perf_counter() - extracting)
         if not yt:
-            Print.error(f"No results found for the query [cyan]{self.query}[/].")
-            exit(1)
-        file_entry = yt["entries"][0] if isinstance(yt, dict) and "entries" in yt else yt
-
-        # Inject custom metadata
-        artist = self.artist if self.artist else file_entry.get("uploader", "")
-        album = (
-            self.album
-            if self.album
-            else (file_entry.get("playlist", "") if file_entry.get("playlist") else "")
+            return None
+        return cast(dict, yt["entries"][0] if isinstance(yt, dict) and "entries" in yt else yt)
+
+    def resolve(self) -> dict | None:
+        """
+        Extract the entry and select its formats without downloading it, so a later download of
+        the same task can start right away.
+
+        Returns:
+            The resolved entry, or None if it is already in the archive or has no results.
+        """
+        if self.id and self.options.dedupe and Archive().lookup(self.id, self.profile):
+            return None
+        with YoutubeDL(self._yt_opts()) as ydl:
+            return self._extract(ydl)
+
+    def _extract_and_fetch(self) -> str | None:
+        with YoutubeDL(self._yt_opts()) as ydl:
+            if self.options.segments > 1 and not self.options.stream:
+                ydl.add_post_processor(
+                    SegmentedPP(self.options.segments, self.options.segment_size), when="before_dl"
+                )
+            file_entry = self._extract(ydl)
+            if not file_entry:
+                Print.error(f"No results found for the query [cyan]{self.query}[/].")
+                exit(1)
+
+            # Inject custom metadata
+            self.artist = self.artist if self.artist else file_entry.get("uploader", "")
+            self.album = (
+                self.album
+                if self.album
+                else (file_entry.get("playlist", "") if file_entry.get("playlist") else "")
+            )
+            cover_url = (self.cover_url or file_entry.get("thumbnail")) or ""
+            self.duration = file_entry.get("duration")
+            YTOptions.inject_metadata(
+                file_entry, self.title, self.artist or "", self.album, cover_url
+            )
+            if self.options.low_memory:
+                prune_info(file_entry)
+
+            if self.options.stream:
+                return self._stream(ydl, file_entry)
+            if self.options.dedupe and not self.id:
+                with FLIGHTS((file_entry["id"], self.profile)):
+                    return self._link(file_entry["id"]) or self._fetch(ydl, file_entry)
+            return self._fetch(ydl, file_entry)
+
+    def _fetch(self, ydl: YoutubeDL, file_entry: dict) -> str | None:
+        """Download a resolved entry and record it in the archive."""
+        self._release()
+        if self.watched:
+            self.watchdog = Watchdog(self.options.stall_timeout, self.options.min_rate)
+        if file_entry.get("requested_subtitles"):
+            budget = self.options.subtitle_requests
+            SUBTITLE_FETCHERS.setdefault(budget, SubtitleFetcher(budget)).fetch(
+                ydl, file_entry, self.options.translated_subtitles
+            )
+        started = time.perf_counter()
+        ydl.process_info(cast("_InfoDict", file_entry))
+        if PROFILER.enabled:
+            done = time.perf_counter()
+            PROFILER.record("download", (self.finished_at or done) - started)
+            PROFILER.record("postprocess", done - (self.finished_at or done))
+        if self.filepath and self.options.dedupe and not self.options.sink.remote:
+            Archive().record(
+                {
+                    "video_id": file_entry["id"],
+                    "profile": self.profile,
+                    "path": self.filepath,
+                    "url": file_entry.get("webpage_url") or self.query,
+                    "title": self.title,
+                    "artist": self.artist,
+                    "album": self.album,
+                    "duration": self.duration,
+                }
+            )
+        return self.filepath
+
+    def _stream(self, ydl: YoutubeDL, file_entry: dict) -> str | None:
+        """Write a resolved entry to stdout, returning '-' once it was written in full."""
+        self._release()
+        # Picked up by ffmpeg when it muxes the streams, ignored for a single plain stream
+        tags = {"title": self.title, "artist": self.artist, "album": self.album}
+        file_entry["downloader_options"] = {
+            **(file_entry.get("downloader_options") or {}),
+            "ffmpeg_args_out": [
+                arg
+                for key, value in tags.items()
+                if value
+                for arg in ("-metadata", f"{key}={value}")
+            ],
+        }
+        if self.watched:
+            self.watchdog = Watchdog(self.options.stall_timeout, self.options.min_rate)
+        ydl.process_info(cast("_InfoDict", file_entry))
+        # There is no final file to hook, a finished transfer is the only sign of success
+        self.filepath = "-" if self.finished_at is not None else None
+        return self.filepath
+
+    def _link(self, video_id: str) -> str | None:
+        """Materialise an already downloaded copy of the video instead of downloading it."""
+        with PROFILER.stage("archive"):
+            media = Archive().lookup(video_id, self.profile)
+        if media is None:
+            return None
+        ext = os.path.splitext(media["path"])[1]
+        dst = os.path.abspath(
+            os.path.join(self.options.sink.dir(self.playlist), sanitize_path(self.title) + ext)
         )
-        cover_url = (self.cover_url or file_entry.get("thumbnail")) or ""
-        YTOptions.inject_metadata(dict(file_entry), self.title, artist or "", album, cover_url)
+        if not os.path.exists(dst):
+            with PROFILER.stage("link"):
+                link_file(media["path"], dst)
+        dst = self.options.sink.store(dst, self.playlist)
+        if self.progress is not None:
+            self.progress.download.update(
+                self.task, description=f"[green]Linked[/] [cyan]{self._title}[/]"
+            )
+            self.progress.download.stop_task(self.task)
+        self.filepath = dst
+        return dst
 
-        ydl.process_info(file_entry)
+    def post_hook(self, filepath: str):
+        """Hook for yt-dlp to move the final file out of the scratch dir and store it."""
+        if self.workdir:
+            dst = os.path.join(self.options.sink.dir(self.playlist), os.path.basename(filepath))
+            move_file(filepath, dst)
+            filepath = dst
+        self.filepath = self.options.sink.store(filepath, self.playlist)
 
     def hook(self, d):
         """Hook for yt-dlp to update the progress bar."""
+        if d["status"] == "finished":
+            self.finished_at = time.perf_counter()
+        with PROFILER.stage("hook"):
+            self._update(d)
+        if self.watchdog is not None:
+            self.watchdog.update(d)
+
+    def retry_sleep(self, n: int) -> None:
+        """Retry sleep function for yt-dlp, aborting once the watchdog gives up on the transfer."""
+        if self.watchdog is not None:
+            self.watchdog.check()
+
+    def _update(self, d):
         if self.progress is not None:
-            total: int = (
-                d["total_bytes"]
-                if "total_bytes" in d
-                else d.get("total_bytes_estimate", d["downloaded_bytes"])
-            )
+            # Merged formats streamed through ffmpeg report no byte counts, None leaves them as is
+            downloaded: int | None = d.get("downloaded_bytes")
+            total: int | None = d.get("total_bytes") or d.get("total_bytes_estimate") or downloaded
             if d["status"] == "downloading":
                 self.progress.download.update(
                     self.task,
                     description=f"[yellow]Downloading[/] [cyan]{self._title}[/]",
                     total=total,
-                    completed=d["downloaded_bytes"],
+                    completed=downloaded,
                 )
             elif d["status"] == "finished":
                 self.progress.download.update(
@@ -114,16 +507,109 @@ class YTDownloader:
                 self.progress.download.stop_task(self.task)
 
 
-@dataclass
-class DownloadTaskSchema(TypedDict):
+# Subtitle selections shared by every task that asks for the same languages
+SHARED_SUBTITLES: dict[tuple[str, ...], tuple[str, ...]] = {}
+
+
+@dataclass(slots=True)
+class DownloadTaskSchema:
+    """
+    A single download task.
+
+    Playlists can hold tens of thousands of tasks, so tasks use slots, and the strings repeated
+    across tasks (type, album, playlist, cover and artist) are interned. `links` lists further
+    playlist folders the downloaded file is linked into.
+    """
+
     query: str
     title: str
-    type: NotRequired[str]
-    album: NotRequired[str]
-    playlist: NotRequired[str]
-    cover_url: NotRequired[str]
-    artist: NotRequired[str]
-    subtitles: NotRequired[list[str] | None]
+    type: str = "default"
+    album: str = ""
+    playlist: str = "."
+    cover_url: str = ""
+    artist: str = ""
+    # Normalised to a shared tuple, any sequence is accepted
+    subtitles: Sequence[str] | None = None
+    duration: float | None = None
+    filesize: int | None = None
+    info: dict | None = None
+    id: str | None = None
+    links: tuple[str, ...] | None = None
+
+    def __post_init__(self):
+        for name in ("type", "album", "playlist", "cover_url", "artist"):
+            value = getattr(self, name)
+            if isinstance(value, str):
+                setattr(self, name, sys.intern(value))
+        if self.subtitles is not None:
+            subtitles = tuple(self.subtitles)
+            self.subtitles = SHARED_SUBTITLES.setdefault(subtitles, subtitles)
+        if self.links is not None:
+            self.links = tuple(sys.intern(link) for link in self.links)
+
+    def to_dict(self) -> dict:
+        """Serialise the task to JSON-compatible data, without its extracted info."""
+        data = {f.name: getattr(self, f.name) for f in fields(self) if f.name != "info"}
+        if self.subtitles is not None:
+            data["subtitles"] = list(self.subtitles)
+        if self.links is not None:
+            data["links"] = list(self.links)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "DownloadTaskSchema":
+        """Load a task serialised with `to_dict`, ignoring unknown keys."""
+        names = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in data.items() if k in names})
+
+
+def drain(items: list) -> Iterator:
+    """Yield the items of a list while emptying it, so each item is freed once it is used."""
+    items.reverse()
+    while items:
+        yield items.pop()
+
+
+ORDER_POLICIES = ("fifo", "shortest-first", "largest-first")
+
+
+def estimate_size(task: DownloadTaskSchema, quality: Quality | None = None) -> int | None:
+    """
+    Estimate the size of a task in bytes from its size or duration hints.
+
+    Parameters:
+        task: The task to estimate.
+        quality: Quality the task is downloaded in. Sizes from durations assume its byterate.
+    """
+    quality = quality or Quality()
+    if task.filesize:
+        size = int(task.filesize)
+    elif task.duration:
+        size = int(task.duration * quality.byterate(task.type))
+    else:
+        return None
+    return min(size, quality.max_filesize) if quality.max_filesize else size
+
+
+def order_tasks(
+    tasks: Iterable[DownloadTaskSchema], order: str = "fifo", quality: Quality | None = None
+) -> Iterable[DownloadTaskSchema]:
+    """
+    Order tasks by a scheduling policy. Tasks without an estimate keep their order and go last.
+    FIFO keeps the tasks as they are, so a generator stays lazy.
+
+    Parameters:
+        tasks: Tasks to order.
+        order: One of 'fifo', 'shortest-first' or 'largest-first'.
+        quality: Quality the tasks are downloaded in.
+    """
+    if order == "fifo":
+        return tasks
+    tasks = list(tasks)
+    known = [task for task in tasks if estimate_size(task, quality) is not None]
+    unknown = [task for task in tasks if estimate_size(task, quality) is None]
+    known.sort(key=lambda task: estimate_size(task, quality) or 0, reverse=order == "largest-first")
+    return known + unknown
 
 
 class Downloader:
@@ -131,27 +617,41 @@ class Downloader:
 
     def __init__(
         self,
-        tasks: DownloadTaskSchema | list[DownloadTaskSchema],
+        tasks: DownloadTaskSchema | Iterable[DownloadTaskSchema],
         progress: ProgressBar | None = None,
         playlist_task: TaskID | None = None,
         threads: int | Literal["max"] = 5,
+        options: DownloadOptions | None = None,
     ):
         """
         Parameters:
-            tasks: Single or multiple download tasks.
+            tasks: Single or multiple download tasks. May be a generator, which is consumed
+                lazily unless ordering or the disk space check need every task up front.
             progress: Progress bar instance.
             playlist_task: Task ID for playlist progress.
             threads: Number of threads to use, or 'max' for all available. Default is 5.
+            options: Run-wide download options.
         """
         self.tasks = self._filter_tasks(tasks)
         self.progress = progress
         self.playlist_task = playlist_task
         self.threads = self._resolve_thread_count(threads)
+        self.options = options or DownloadOptions()
+        self.verifier = Verifier(self.options.verify_threads) if self.options.verify else None
+        self.slots = (
+            BoundedSemaphore(max(self.options.max_resolved, 1)) if self.options.low_memory else None
+        )
+        self.lock = Lock()
+        # Stalled tasks waiting out their backoff, as (ready at, sequence, attempt, task, workdir)
+        self.requeued: list[tuple[float, int, int, DownloadTaskSchema, str | None]] = []
+        self.sequence = itertools.count()
+        self.lookahead: Lookahead | None = None
+        self.failures = 0
 
     def _filter_tasks(
-        self, tasks: DownloadTaskSchema | list[DownloadTaskSchema]
-    ) -> list[DownloadTaskSchema]:
-        if isinstance(tasks, dict):
+        self, tasks: DownloadTaskSchema | Iterable[DownloadTaskSchema]
+    ) -> Iterable[DownloadTaskSchema]:
+        if isinstance(tasks, DownloadTaskSchema):
             tasks = [tasks]
         return tasks
 
@@ -162,42 +662,252 @@ class Downloader:
             return 1
         return int(threads)
 
-    def _download_task(self, task: DownloadTaskSchema):
-        if task.get("query") and task.get("title"):
-            yt_type = task.get("type", "default")
-            if yt_type not in ("audio", "video", "default"):
-                yt_type = "default"
-            YTDownloader(
-                query=task.get("query", ""),
-                title=task.get("title", ""),
-                type=yt_type,
-                album=task.get("album", ""),
-                playlist=task.get("playlist", "."),
-                cover_url=task.get("cover_url", ""),
-                artist=task.get("artist", ""),
-                subtitles=task.get("subtitles", None),
-                progress=self.progress,
-            ).download()
+    def _advance(self):
         if self.progress is not None and self.playlist_task is not None:
             self.progress.playlist.update(
                 self.playlist_task,
                 advance=1,
             )
 
+    def run_task(self, task: DownloadTaskSchema, workdir: str | None = None) -> str | None:
+        """
+        Download a single task without touching the playlist progress.
+
+        Parameters:
+            task: The task to download.
+            workdir: Scratch directory in `temp_dir` to download in, kept after the download.
+
+        Returns:
+            Path of the downloaded file, or None if nothing was downloaded.
+        """
+        resolved = self.lookahead.take(task) if self.lookahead is not None else None
+        if not (task.query and task.title):
+            return None
+        # The extracted info is only needed once, hand it over instead of keeping it on the task
+        info, task.info = task.info, None
+        downloader = self._downloader(task, resolved or info, self.progress, workdir)
+        filepath = downloader.download()
+        # A streamed item has no file to verify or link
+        if not filepath or self.options.stream:
+            return filepath
+        if self.verifier is not None:
+            self.verifier.submit(
+                filepath, downloader.type, downloader.duration, self.options.quality.cover
+            )
+        for playlist in task.links or ():
+            self.options.sink.link(filepath, playlist)
+        return filepath
+
+    def _downloader(
+        self,
+        task: DownloadTaskSchema,
+        info: dict | None,
+        progress: ProgressBar | None = None,
+        workdir: str | None = None,
+    ) -> YTDownloader:
+        yt_type = task.type
+        if yt_type not in ("audio", "video", "default"):
+            yt_type = "default"
+        return YTDownloader(
+            query=task.query,
+            title=task.title,
+            type=yt_type,
+            album=task.album,
+            playlist=task.playlist,
+            cover_url=task.cover_url,
+            artist=task.artist,
+            subtitles=list(task.subtitles) if task.subtitles is not None else None,
+            progress=progress,
+            options=self.options,
+            info=info,
+            id=task.id,
+            slots=self.slots,
+            workdir=workdir,
+        )
+
+    def _resolve(self, task: DownloadTaskSchema) -> dict | None:
+        """Resolve a task ahead of its download, leaving its own info for the download."""
+        if not (task.query and task.title):
+            return None
+        return self._downloader(task, task.info).resolve()
+
+    def _download_task(
+        self, task: DownloadTaskSchema, attempt: int = 0, workdir: str | None = None
+    ):
+        # Kept across requeues of the task, so the next attempt resumes from its `.part` file
+        if workdir is None and self.options.temp_dir and not self.options.stream:
+            os.makedirs(self.options.temp_dir, exist_ok=True)
+            workdir = tempfile.mkdtemp(prefix="multidl-", dir=self.options.temp_dir)
+        try:
+            self.run_task(task, workdir)
+        except StalledError as e:
+            # Bytes already written to stdout can't be taken back
+            if attempt < self.options.requeues and not self.options.stream:
+                # Retried after the tasks already waiting, once its backoff has passed
+                ready = time.monotonic() + REQUEUE_BACKOFF * 2**attempt
+                with self.lock:
+                    heapq.heappush(
+                        self.requeued, (ready, next(self.sequence), attempt + 1, task, workdir)
+                    )
+                # Handed over to the requeued attempt
+                workdir = None
+                return
+            Print.error(f"Gave up on [cyan]{task.title}[/]: {e}")
+            if self.progress is not None and self.progress.windowed:
+                self.progress.retire(None, failed=True)
+        finally:
+            if workdir is not None:
+                shutil.rmtree(workdir, ignore_errors=True)
+        self._advance()
+
+    def _next_task(self, pending: Iterator[DownloadTaskSchema]) -> tuple | None:
+        """Get the next task, its attempt and workdir, waiting out the backoff of requeued tasks."""
+        while True:
+            with self.lock:
+                if self.requeued and self.requeued[0][0] <= time.monotonic():
+                    _, _, attempt, task, workdir = heapq.heappop(self.requeued)
+                    return task, attempt, workdir
+                try:
+                    task = next(pending, None)
+                except (Exception, SystemExit) as e:
+                    # A generator that raised is done, the tasks it already gave are still run
+                    if not isinstance(e, SystemExit):
+                        Print.error(f"Stopped listing the tasks: {e}")
+                    task = None
+                if task is not None:
+                    return task, 0, None
+                if not self.requeued:
+                    return None
+                wait = self.requeued[0][0] - time.monotonic()
+            time.sleep(max(wait, 0))
+
+    def _work(self, pending: Iterator[DownloadTaskSchema]):
+        """Download tasks until none are left. A failed task doesn't stop the thread."""
+        while (item := self._next_task(pending)) is not None:
+            try:
+                self._download_task(*item)
+            except (Exception, SystemExit) as e:
+                # Exits are reported before exiting
+                if not isinstance(e, SystemExit):
+                    Print.error(f"Failed to download [cyan]{item[0].title}[/]: {e}")
+                with self.lock:
+                    self.failures += 1
+                self._advance()
+
+    def _publish(self, tasks: Iterable[DownloadTaskSchema]):
+        """Publish the tasks to the shared job queue instead of downloading them."""
+        # Workers download each job in the quality it was published with
+        quality = {"quality": self.options.quality.key} if self.options.quality.key else {}
+        count = JobQueue(cast(str, self.options.queue)).publish(
+            task.to_dict() | quality for task in tasks
+        )
+        if self.progress is not None and self.playlist_task is not None:
+            self.progress.playlist.update(self.playlist_task, advance=count)
+        Print.success(f"Queued [cyan]{count}[/] task(s) to [cyan]{self.options.queue}[/]")
+
+    def _preflight(self, tasks: list[DownloadTaskSchema]):
+        """Refuse to start, or lower the thread count, when the disks can't hold the tasks."""
+        sizes = sorted(
+            (estimate_size(task, self.options.quality) or 0 for task in tasks), reverse=True
+        )
+        total = sum(sizes)
+        if not total:
+            return
+        final_dir = os.path.abspath(self.options.sink.dir(tasks[0].playlist))
+        while not os.path.isdir(final_dir):
+            final_dir = os.path.dirname(final_dir)
+        final_free = shutil.disk_usage(final_dir).free
+        # Without a scratch dir, intermediates of the running tasks live next to the outputs
+        needed = total if self.options.temp_dir else total + sum(sizes[: self.threads])
+        # Files stored off this machine don't stay on the local disk
+        if final_free < needed and not self.options.sink.remote:
+            Print.error(
+                f"Not enough free space: about [cyan]{decimal(needed)}[/] needed, "
+                f"[cyan]{decimal(final_free)}[/] free in [cyan]{final_dir}[/]."
+            )
+            exit(1)
+        if not self.options.temp_dir:
+            return
+        os.makedirs(self.options.temp_dir, exist_ok=True)
+        temp_free = shutil.disk_usage(self.options.temp_dir).free
+        # A running task needs room for its streams plus the merged output
+        threads = self.threads
+        while threads and 2 * sum(sizes[:threads]) > temp_free:
+            threads -= 1
+        if not threads:
+            Print.error(
+                f"Not enough scratch space: about [cyan]{decimal(2 * sizes[0])}[/] needed, "
+                f"[cyan]{decimal(temp_free)}[/] free in [cyan]{self.options.temp_dir}[/]."
+            )
+            exit(1)
+        if threads < self.threads:
+            Print.warn(
+                f"Only [cyan]{decimal(temp_free)}[/] free in [cyan]{self.options.temp_dir}[/]. "
+                f"Using [cyan]{threads}[/] thread(s) instead of [cyan]{self.threads}[/]."
+            )
+            self.threads = threads
+
     def download(self):
-        if not self.tasks:
+        tasks = order_tasks(self.tasks, self.options.order, self.options.quality)
+        self.tasks = []
+        if self.options.plan is not None:
+            count = len(self.options.plan)
+            self.options.plan.extend(tasks)
+            if self.progress is not None and self.playlist_task is not None:
+                self.progress.playlist.update(
+                    self.playlist_task, advance=len(self.options.plan) - count
+                )
             return
-        if len(self.tasks) == 1:
-            self._download_task(self.tasks[0])
+        if self.options.queue:
+            self._publish(tasks)
             return
+        if self.options.stream:
+            tasks = list(tasks)
+            if len(tasks) != 1:
+                Print.error("Only a single item can be streamed to stdout.")
+                exit(1)
+        elif self.options.preflight:
+            # Listing lazy tasks would resolve the whole collection before the first download
+            if isinstance(tasks, list):
+                self._preflight(tasks)
+            else:
+                Print.warn("Skipped the free space check, the tasks are built as they download.")
+        threads = self.threads
+        if isinstance(tasks, list):
+            if not tasks:
+                return
+            if len(tasks) == 1:
+                self._work(iter(tasks))
+                self._report()
+                if self.failures:
+                    exit(1)
+                return
+            threads = min(threads, len(tasks))
+        # Finished rows are folded into a summary, so the display doesn't grow with the run
+        if self.progress is not None:
+            self.progress.windowed = True
 
-        threads: list[Thread] = []
-        for task in self.tasks:
-            t = Thread(target=self._download_task, args=(task,))
+        # Each thread pulls the next task as soon as it is free, so the order is kept
+        pending = iter(tasks)
+        # Entries resolved ahead are neither pruned nor counted against `max_resolved`
+        window = 0 if self.options.low_memory else self.options.lookahead
+        if window > 0:
+            self.lookahead = Lookahead(tasks, self._resolve, window)
+            pending = iter(self.lookahead)
+        workers = [Thread(target=self._work, args=(pending,)) for _ in range(threads)]
+        for t in workers:
             t.start()
-            threads.append(t)
-            if len(threads) >= self.threads:
-                threads[0].join()
-                threads.pop(0)
-        for t in threads:
+        for t in workers:
             t.join()
+        if self.lookahead is not None:
+            self.lookahead.close()
+            self.lookahead = None
+        self._report()
+
+    def _report(self):
+        self.options.sink.flush()
+        if self.verifier is not None:
+            report(self.verifier.results())
+        peak = peak_rss()
+        if self.options.low_memory and peak is not None:
+            Print.success(f"Peak memory: [cyan]{decimal(peak)}[/]")
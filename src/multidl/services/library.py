@@ -0,0 +1,168 @@
+import os
+from ..archive import Archive
+from ..term import Print, ProgressBar
+from ..utils import Quality, sanitize_path
+from .helpers import Downloader, DownloadOptions, DownloadTaskSchema
+from .retag import RetagResult, TagSchema, fetch_covers, retag_file, summary
+from .spotify import Spotify
+from .verify import Verifier, report, scan
+from concurrent.futures import ProcessPoolExecutor
+
+
+class Library:
+    """
+    Operations on an existing library of downloaded media.
+
+    Parameters:
+        dir: Root directory of the library.
+        threads: Number of files to process at once.
+    """
+
+    def __init__(self, dir: str, threads: int = 4):
+        self.dir = os.path.abspath(dir)
+        self.threads = threads
+        self.progress = ProgressBar()
+        self.archive = Archive()
+
+    def verify(self, requeue: bool = False, queue: str | None = None) -> None:
+        """
+        Verify every media file of the library in parallel.
+
+        Parameters:
+            requeue: Remove bad files and download them again, if they are in the archive.
+            queue: Publish the re-downloads to a shared job queue instead of running them.
+        """
+        files = scan(self.dir)
+        entries = {path: self.archive.find(path) for path in files}
+        verifier = Verifier(self.threads)
+        with self.progress.live:
+            task = self.progress.playlist.add_task(
+                f"[yellow]Verifying[/] [cyan]{self.dir}[/]", total=len(files)
+            )
+            for path, media in entries.items():
+                # Profiles are 'type:subtitles' with the quality key appended when not the default
+                profile = media["profile"].split(":") if media else []
+                future = verifier.submit(
+                    path,
+                    profile[0] if profile else None,
+                    media.get("duration") if media else None,
+                    Quality.from_key(profile[2] if len(profile) > 2 else "").cover,
+                )
+                future.add_done_callback(lambda _: self.progress.playlist.update(task, advance=1))
+            bad = verifier.results()
+            self.progress.playlist.update(
+                task, description=f"[green]Verified[/] [cyan]{self.dir}[/]"
+            )
+        report(bad)
+        if not requeue or not bad:
+            return
+
+        # Files are downloaded again in the quality they were downloaded in
+        groups: dict[str, list[DownloadTaskSchema]] = {}
+        for result in bad:
+            media = entries[result["path"]]
+            if media is None:
+                continue
+            os.remove(result["path"])
+            type, _, rest = media["profile"].partition(":")
+            subtitles, _, quality = rest.partition(":")
+            groups.setdefault(quality, []).append(
+                DownloadTaskSchema(
+                    query=media["url"],
+                    title=os.path.splitext(os.path.basename(result["path"]))[0],
+                    type=type,
+                    album=media["album"],
+                    artist=media["artist"],
+                    playlist=os.path.dirname(result["path"]).replace(os.sep, "%dir%"),
+                    subtitles=subtitles.split(",") if subtitles else None,
+                    duration=media.get("duration"),
+                    id=media["video_id"],
+                )
+            )
+        total = sum(len(tasks) for tasks in groups.values())
+        with self.progress.live:
+            task = self.progress.playlist.add_task(
+                f"[yellow]Re-downloading[/] [cyan]{total}[/] file(s)", total=total
+            )
+            for quality, tasks in groups.items():
+                Downloader(
+                    tasks=tasks,
+                    progress=self.progress,
+                    playlist_task=task,
+                    threads=self.threads,
+                    options=DownloadOptions.from_config(
+                        queue=queue, verify=True, quality=Quality.from_key(quality)
+                    ),
+                ).download()
+
+    def retag(self, spotify: str | None = None) -> None:
+        """
+        Update the tags and cover art of the library in place, without downloading it again.
+
+        Files are rewritten by mutagen in a process pool, only their tag blocks are written.
+
+        Parameters:
+            spotify: URL of a Spotify playlist or album to take the tags and covers from, matched
+                to the files by title. The archive is taken as the source if not given.
+        """
+        files = scan(self.dir)
+        if spotify is not None:
+            tags = self._spotify_tags(spotify, files)
+            # Later lookups and re-downloads keep the corrected tags
+            self.archive.set_tags(
+                (tag["path"], tag["title"], tag["artist"], tag["album"]) for tag in tags
+            )
+        else:
+            existing = set(files)
+            tags = [
+                TagSchema(
+                    path=media["path"],
+                    title=media["title"] or "",
+                    artist=media["artist"] or "",
+                    album=media["album"] or "",
+                    cover=None,
+                )
+                for media in self.archive.under(self.dir)
+                if media["path"] in existing
+            ]
+        results: list[RetagResult] = []
+        if tags:
+            with self.progress.live, ProcessPoolExecutor(max_workers=self.threads) as pool:
+                task = self.progress.playlist.add_task(
+                    f"[yellow]Retagging[/] [cyan]{self.dir}[/]", total=len(tags)
+                )
+                chunksize = max(1, min(64, len(tags) // (self.threads * 4)))
+                for result in pool.map(retag_file, tags, chunksize=chunksize):
+                    results.append(result)
+                    self.progress.playlist.update(task, advance=1)
+                self.progress.playlist.update(
+                    task, description=f"[green]Retagged[/] [cyan]{self.dir}[/]"
+                )
+        summary(results, len(files))
+
+    def _spotify_tags(self, url: str, files: list[str]) -> list[TagSchema]:
+        """Match the files to the tracks of a Spotify playlist or album by title."""
+        if "playlist" not in url and "album" not in url:
+            Print.error("Only Spotify playlists and albums can be retagged from.")
+            exit(1)
+        source = Spotify(url)
+        _, entries = source.pl_entries(".") if "playlist" in url else source.album_entries(".")
+        stems: dict[str, list[str]] = {}
+        for path in files:
+            stems.setdefault(os.path.splitext(os.path.basename(path))[0], []).append(path)
+        matched = [
+            (path, task)
+            for task in entries.values()
+            for path in stems.pop(sanitize_path(task.title), [])
+        ]
+        covers = fetch_covers({task.cover_url for _, task in matched if task.cover_url})
+        return [
+            TagSchema(
+                path=path,
+                title=task.title,
+                artist=task.artist,
+                album=task.album,
+                cover=covers.get(task.cover_url),
+            )
+            for path, task in matched
+        ]
@@ -0,0 +1,112 @@
+import re
+import time
+from ..profiling import PROFILER
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .helpers import DownloadTaskSchema
+
+# Signed format URLs carry their expiry as a Unix time, e.g. `?expire=` or `/expire/` on YouTube
+EXPIRE = re.compile(r"[?&/]expire[=/](\d+)")
+
+# Seconds a resolved entry must stay valid after its download starts, or it is resolved again
+EXPIRY_MARGIN = 30 * 60
+
+# Seconds a resolved entry is trusted for when its URLs don't say when they expire
+DEFAULT_TTL = 60 * 60
+
+
+def expires_at(info: dict) -> float:
+    """Unix time the selected format URLs of a resolved entry expire at."""
+    formats = info.get("requested_formats") or [info]
+    expiries = [
+        int(match.group(1))
+        for f in formats
+        for url in (f.get("url"), f.get("manifest_url"))
+        if url and (match := EXPIRE.search(url))
+    ]
+    return min(expiries) if expiries else time.time() + DEFAULT_TTL
+
+
+class Lookahead:
+    """
+    Resolves upcoming tasks while the current ones transfer.
+
+    Iterating yields the tasks in order. The next `window` tasks past the ones handed out are
+    resolved on a thread pool in the meantime, so a worker that takes one starts its transfer
+    right away. Entries whose signed URLs would expire too soon are dropped and resolved again
+    by the worker, as is a task whose resolution hasn't started by the time it is taken.
+
+    Parameters:
+        tasks: Tasks to download, consumed lazily.
+        resolve: Resolves a task, returning its entry or None if there is nothing to resolve.
+        window: Number of tasks resolved ahead.
+    """
+
+    def __init__(
+        self,
+        tasks: Iterable["DownloadTaskSchema"],
+        resolve: Callable[["DownloadTaskSchema"], dict | None],
+        window: int,
+    ):
+        self.tasks = iter(tasks)
+        self.resolve = resolve
+        self.window = max(window, 1)
+        self.pool = ThreadPoolExecutor(max_workers=self.window)
+        self.lock = Lock()
+        self.ahead: deque[DownloadTaskSchema] = deque()
+        # Resolutions by the id of their task, until the task is taken
+        self.resolving: dict[int, Future] = {}
+
+    def __iter__(self) -> Iterator["DownloadTaskSchema"]:
+        return self
+
+    def __next__(self) -> "DownloadTaskSchema":
+        with self.lock:
+            self._fill()
+            if not self.ahead:
+                raise StopIteration
+            task = self.ahead.popleft()
+            self._fill()
+            return task
+
+    def _fill(self):
+        while len(self.ahead) < self.window and (task := next(self.tasks, None)) is not None:
+            self.ahead.append(task)
+            self.resolving[id(task)] = self.pool.submit(self._resolve, task)
+
+    def _resolve(self, task: "DownloadTaskSchema") -> tuple[dict, float] | None:
+        info = self.resolve(task)
+        return None if info is None else (info, expires_at(info))
+
+    def take(self, task: "DownloadTaskSchema") -> dict | None:
+        """
+        Get the resolved entry of a task handed out by the iterator, waiting if it is resolving.
+
+        Returns:
+            The resolved entry, or None if the task has to be resolved as usual.
+        """
+        with self.lock:
+            future = self.resolving.pop(id(task), None)
+        # Not started yet, the worker resolving it itself is no slower than waiting for it
+        if future is None or future.cancel():
+            return None
+        started = time.perf_counter()
+        try:
+            resolved = future.result()
+        except Exception:
+            return None
+        finally:
+            PROFILER.record("lookahead-wait", time.perf_counter() - started)
+        if resolved is None:
+            return None
+        info, expires = resolved
+        return info if expires - time.time() > EXPIRY_MARGIN else None
+
+    def close(self):
+        """Stop resolving tasks that weren't handed out."""
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,201 @@
+import datetime
+import json
+import os
+from ..term import InfoTable, Print
+from ..utils import sanitize_path
+from .helpers import Downloader, DownloadOptions, DownloadTaskSchema
+from .spotify import Spotify
+from .yt import YouTube
+from typing import Literal, TypedDict
+
+MIRROR_VERSION = 1
+SNAPSHOT_FILE = ".multidl-mirror.json"
+# Leftovers of interrupted downloads, never counted as mirrored files
+PARTIAL_SUFFIXES = (".part", ".ytdl", ".multidl-part")
+
+
+class SnapshotSchema(TypedDict):
+    version: int
+    source: str
+    title: str
+    synced: str
+    marker: dict | None
+    entries: dict[str, str]
+
+
+class Mirror:
+    """
+    Keeps a directory in sync with a YouTube or Spotify playlist.
+
+    The last sync is stored as a snapshot in the directory: the entry IDs and a change marker of
+    the playlist (the Spotify `snapshot_id`, or the YouTube modified date and item count). While
+    the marker is unchanged, a sync costs a single request and nothing is enumerated. Otherwise
+    the playlist is enumerated and only entries without a file are downloaded.
+
+    Parameters:
+        url: URL of the playlist.
+        dir: Directory to mirror the playlist into.
+        prune: Delete the files of entries removed from the playlist.
+    """
+
+    def __init__(self, url: str, dir: str, prune: bool = False):
+        if "playlist" not in url:
+            Print.error("Only YouTube and Spotify playlists can be mirrored.")
+            exit(1)
+        self.url = url
+        self.dir = os.path.abspath(dir)
+        self.prune = prune
+        self.path = os.path.join(self.dir, SNAPSHOT_FILE)
+        self.source = Spotify(url) if "open.spotify.com" in url else YouTube(url)
+
+    def load(self) -> SnapshotSchema | None:
+        """Read the snapshot of the last sync, if the directory was synced before."""
+        try:
+            with open(self.path) as f:
+                snapshot: SnapshotSchema = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            Print.error(f"Can't read the mirror snapshot [cyan]{self.path}[/]: {e}")
+            exit(1)
+        if snapshot.get("version") != MIRROR_VERSION:
+            Print.error(
+                f"Unsupported snapshot version [cyan]{snapshot.get('version')}[/] "
+                f"in [cyan]{self.path}[/]."
+            )
+            exit(1)
+        if snapshot["source"] != self.url:
+            Print.error(
+                f"[cyan]{self.dir}[/] mirrors another playlist: [cyan]{snapshot['source']}[/]"
+            )
+            exit(1)
+        return snapshot
+
+    def save(self, snapshot: SnapshotSchema) -> None:
+        """Write the snapshot, replacing the previous one in a single step."""
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(snapshot, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def files(self) -> dict[str, list[str]]:
+        """Get the finished files of the directory by name without extension."""
+        files: dict[str, list[str]] = {}
+        with os.scandir(self.dir) as it:
+            for entry in it:
+                if (
+                    not entry.is_file()
+                    or entry.name.startswith(".")
+                    or entry.name.endswith(PARTIAL_SUFFIXES)
+                ):
+                    continue
+                files.setdefault(os.path.splitext(entry.name)[0], []).append(entry.name)
+        return files
+
+    def sync(
+        self,
+        type: Literal["audio", "video", "default"] = "default",
+        subtitles: list[str] | None = None,
+        threads: int | Literal["max"] = 5,
+        options: DownloadOptions | None = None,
+        full: bool = False,
+    ) -> None:
+        """
+        Bring the directory in line with the playlist.
+
+        Parameters:
+            type: The type of media to download (YouTube only).
+            subtitles: Subtitle languages to download (YouTube only).
+            threads: Number of threads to use, or 'max' for all available.
+            options: Run-wide download options.
+            full: Enumerate the playlist even if its marker is unchanged, retrying entries that
+                failed before.
+        """
+        snapshot = self.load()
+        # Taken before enumerating, so a change made meanwhile is picked up by the next sync
+        marker = self.source.pl_marker()
+        if snapshot and marker and snapshot["marker"] == marker and not full:
+            Print.success(
+                f"[cyan]{snapshot['title']}[/] is unchanged since "
+                f"[cyan]{snapshot['synced']}[/], nothing to sync."
+            )
+            return
+
+        playlist = self.dir.replace(os.sep, "%dir%")
+        if isinstance(self.source, Spotify):
+            title, entries = self.source.pl_entries(playlist)
+        else:
+            title, entries = self.source.pl_entries(playlist, type, subtitles)
+        known = snapshot["entries"] if snapshot else {}
+        os.makedirs(self.dir, exist_ok=True)
+        files = self.files()
+
+        # Entries sharing a title share a file, download it once
+        missing: dict[str, DownloadTaskSchema] = {}
+        for task in entries.values():
+            stem = sanitize_path(task.title)
+            if stem not in files:
+                missing.setdefault(stem, task)
+        if missing:
+            with self.source.progress.live:
+                bar = self.source.progress.playlist.add_task(
+                    f"[yellow]Mirroring[/] [cyan]{title}[/]", total=len(missing)
+                )
+                Downloader(
+                    tasks=list(missing.values()),
+                    progress=self.source.progress,
+                    playlist_task=bar,
+                    threads=threads,
+                    options=options,
+                ).download()
+                self.source.progress.playlist.update(
+                    bar, description=f"[green]Mirrored[/] [cyan]{title}[/]", completed=len(missing)
+                )
+
+        removed = {id: name for id, name in known.items() if id not in entries}
+        pruned = 0
+        if self.prune:
+            kept = {sanitize_path(task.title) for task in entries.values()}
+            for name in removed.values():
+                stem = sanitize_path(name)
+                if stem in kept:
+                    continue
+                for file in files.get(stem, []):
+                    os.remove(os.path.join(self.dir, file))
+                    pruned += 1
+        files = self.files()
+        mirrored = {
+            id: task.title for id, task in entries.items() if sanitize_path(task.title) in files
+        }
+        # Removed entries whose files are kept stay in the snapshot, so a later sync can prune them
+        kept_removed = {id: name for id, name in removed.items() if sanitize_path(name) in files}
+        self.save(
+            {
+                "version": MIRROR_VERSION,
+                "source": self.url,
+                "title": title,
+                "synced": datetime.datetime.now(datetime.UTC).isoformat(timespec="seconds"),
+                "marker": marker,
+                "entries": mirrored | kept_removed,
+            }
+        )
+
+        failed = len(entries) - len(mirrored)
+        InfoTable(
+            "Mirror",
+            [
+                ("Playlist", title),
+                ("Directory", self.dir),
+                ("Entries", str(len(entries))),
+                ("Added", str(sum(id not in known for id in entries))),
+                ("Removed", str(len(removed))),
+                ("Downloaded", str(len(missing) - sum(stem not in files for stem in missing))),
+                ("Pruned Files", str(pruned)),
+                ("Failed", str(failed)),
+            ],
+        ).print()
+        if failed:
+            Print.warn(
+                f"[cyan]{failed}[/] entries could not be downloaded. "
+                "Run again with [cyan]--full[/] to retry them."
+            )
@@ -0,0 +1,201 @@
+import datetime
+import json
+from ..term import InfoTable, Print, ProgressBar
+from ..utils import Quality, SuppressLogger
+from .helpers import Downloader, DownloadOptions, DownloadTaskSchema, estimate_size
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from rich.filesize import decimal
+from rich.markup import escape
+from typing import TYPE_CHECKING, Literal, NotRequired, TypedDict, cast
+from yt_dlp import YoutubeDL
+from yt_dlp.utils import YoutubeDLError
+
+if TYPE_CHECKING:
+    from yt_dlp import _Params
+
+PLAN_VERSION = 1
+
+
+class PlanTotals(TypedDict):
+    tasks: int
+    duration: float
+    size: int
+    unestimated: int
+
+
+class PlanSchema(TypedDict):
+    version: int
+    created: str
+    sources: list[str]
+    totals: PlanTotals
+    quality: NotRequired[str]
+    tasks: list[dict]
+
+
+def is_search(query: str) -> bool:
+    """Check if a task query is a search rather than a URL."""
+    return not (query.startswith("http://") or query.startswith("https://"))
+
+
+class Plan:
+    """
+    Resolved download tasks, written to a JSON manifest and run later, possibly on another host.
+
+    Parameters:
+        tasks: Tasks of the plan.
+        sources: URLs the plan was built from.
+        quality: Quality the tasks are downloaded in.
+    """
+
+    def __init__(
+        self,
+        tasks: list[DownloadTaskSchema],
+        sources: list[str] | None = None,
+        quality: Quality | None = None,
+    ):
+        self.tasks = tasks
+        self.sources = sources or []
+        self.quality = quality or Quality()
+        self.progress = ProgressBar()
+
+    def _resolve_task(self, task: DownloadTaskSchema) -> None:
+        """Replace a search query with the URL of its first YouTube result."""
+        opts: "_Params" = {  # noqa: UP037
+            "quiet": True,
+            "noprogress": True,
+            "ignoreerrors": True,
+            "no_warnings": True,
+            "logger": SuppressLogger(),
+            "extract_flat": True,
+        }
+        try:
+            with YoutubeDL(opts) as ydl:
+                info = ydl.extract_info(f"ytsearch1:{task.query}", download=False)
+        except YoutubeDLError:
+            return
+        entries = list(cast(Iterable, (info or {}).get("entries") or []))
+        if not entries or not entries[0].get("url"):
+            return
+        task.query = entries[0]["url"]
+        task.id = entries[0].get("id")
+        task.duration = task.duration or entries[0].get("duration")
+
+    def resolve(self, threads: int = 5) -> int:
+        """
+        Resolve the search queries of the plan to YouTube URLs, so running it needs no searches.
+
+        Parameters:
+            threads: Number of queries to resolve at once.
+
+        Returns:
+            Number of queries that could not be resolved.
+        """
+        searches = [task for task in self.tasks if is_search(task.query)]
+        if not searches:
+            return 0
+        with self.progress.live:
+            bar = self.progress.playlist.add_task(
+                "[yellow]Resolving[/] search queries", total=len(searches)
+            )
+            with ThreadPoolExecutor(max_workers=max(threads, 1)) as pool:
+                for _ in pool.map(self._resolve_task, searches):
+                    self.progress.playlist.update(bar, advance=1)
+            self.progress.playlist.update(bar, description="[green]Resolved[/] search queries")
+        return sum(is_search(task.query) for task in searches)
+
+    def totals(self) -> PlanTotals:
+        """Get the number of tasks and their estimated duration and size."""
+        sizes = [estimate_size(task, self.quality) for task in self.tasks]
+        return {
+            "tasks": len(self.tasks),
+            "duration": sum(task.duration or 0 for task in self.tasks),
+            "size": sum(size or 0 for size in sizes),
+            "unestimated": sizes.count(None),
+        }
+
+    def save(self, path: str) -> None:
+        """
+        Write the plan to a JSON manifest.
+
+        Parameters:
+            path: Path of the manifest.
+        """
+        plan: PlanSchema = {
+            "version": PLAN_VERSION,
+            "created": datetime.datetime.now(datetime.UTC).isoformat(timespec="seconds"),
+            "sources": self.sources,
+            "totals": self.totals(),
+            "quality": self.quality.key,
+            "tasks": [task.to_dict() for task in self.tasks],
+        }
+        with open(path, "w") as f:
+            json.dump(plan, f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> "Plan":
+        """
+        Read a plan from a JSON manifest.
+
+        Parameters:
+            path: Path of the manifest.
+        """
+        try:
+            with open(path) as f:
+                plan: PlanSchema = json.load(f)
+        except (OSError, ValueError) as e:
+            Print.error(f"Can't read the plan [cyan]{path}[/]: {e}")
+            exit(1)
+        if plan.get("version") != PLAN_VERSION:
+            Print.error(
+                f"Unsupported plan version [cyan]{plan.get('version')}[/] in [cyan]{path}[/]."
+            )
+            exit(1)
+        return cls(
+            [DownloadTaskSchema.from_dict(task) for task in plan["tasks"]],
+            plan["sources"],
+            Quality.from_key(plan.get("quality", "")),
+        )
+
+    def print(self, title: str = "Plan") -> None:
+        """Print the totals of the plan."""
+        totals = self.totals()
+        data = [
+            ("Sources", ", ".join(self.sources)),
+            ("Tasks", str(totals["tasks"])),
+            ("Duration", str(datetime.timedelta(seconds=round(totals["duration"])))),
+            ("Estimated Size", decimal(totals["size"])),
+            ("Without Estimate", str(totals["unestimated"])),
+            ("Quality", self.quality.key or self.quality.profile),
+        ]
+        # The format decision of each kind of task, and the work it costs after downloading
+        for type in dict.fromkeys(task.type for task in self.tasks):
+            selector = " / ".join(self.quality.format(type).split("/"))
+            data.append((f"Format ({type})", escape(selector)))
+            data.append((f"Postprocessing ({type})", ", ".join(self.quality.postprocessing(type))))
+        InfoTable(title, data).print()
+
+    def run(
+        self, threads: int | Literal["max"] = 5, options: DownloadOptions | None = None
+    ) -> None:
+        """
+        Download the tasks of the plan.
+
+        Parameters:
+            threads: Number of threads to use, or 'max' for all available.
+            options: Run-wide download options. The quality of the plan replaces theirs.
+        """
+        options = replace(options or DownloadOptions(), quality=self.quality)
+        with self.progress.live:
+            bar = self.progress.playlist.add_task("[yellow]Running plan[/]", total=len(self.tasks))
+            Downloader(
+                tasks=self.tasks,
+                progress=self.progress,
+                playlist_task=bar,
+                threads=threads,
+                options=options,
+            ).download()
+            self.progress.playlist.update(
+                bar, description="[green]Ran plan[/]", completed=len(self.tasks)
+            )
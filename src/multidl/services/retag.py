@@ -0,0 +1,157 @@
+import base64
+import mutagen
+import requests
+from ..term import InfoTable, Print
+from concurrent.futures import ThreadPoolExecutor
+from mutagen.flac import Picture
+from mutagen.id3 import APIC, ID3, TALB, TIT2, TPE1
+from mutagen.mp4 import MP4Cover, MP4Tags
+from mutagen.oggopus import OggOpusVComment
+from mutagen.oggvorbis import OggVCommentDict
+from typing import TypedDict
+
+# Cover art downloads running at once
+COVER_REQUESTS = 8
+
+
+class TagSchema(TypedDict):
+    path: str
+    title: str
+    artist: str
+    album: str
+    cover: bytes | None
+
+
+class RetagResult(TypedDict):
+    path: str
+    changed: bool
+    problem: str
+
+
+def cover_mime(data: bytes) -> str:
+    """Get the MIME type of cover art from its first bytes."""
+    return "image/png" if data.startswith(b"\x89PNG") else "image/jpeg"
+
+
+def fetch_covers(urls: set[str]) -> dict[str, bytes]:
+    """Download cover art concurrently. Covers that fail to download are left out."""
+
+    def fetch(url: str) -> bytes | None:
+        try:
+            response = requests.get(url, timeout=30)
+        except requests.RequestException:
+            return None
+        return response.content if response.ok else None
+
+    with ThreadPoolExecutor(max_workers=COVER_REQUESTS) as pool:
+        covers = dict(zip(urls, pool.map(fetch, urls), strict=True))
+    return {url: data for url, data in covers.items() if data}
+
+
+def _tag_mp4(tags: MP4Tags, tag: TagSchema) -> bool:
+    changed = False
+    for key, value in (
+        ("\xa9nam", tag["title"]),
+        ("\xa9ART", tag["artist"]),
+        ("\xa9alb", tag["album"]),
+    ):
+        if value and tags.get(key) != [value]:
+            tags[key] = [value]
+            changed = True
+    if tag["cover"] and [bytes(c) for c in tags.get("covr") or []] != [tag["cover"]]:
+        fmt = (
+            MP4Cover.FORMAT_PNG if cover_mime(tag["cover"]) == "image/png" else MP4Cover.FORMAT_JPEG
+        )
+        tags["covr"] = [MP4Cover(tag["cover"], imageformat=fmt)]
+        changed = True
+    return changed
+
+
+def _tag_vorbis(tags: OggVCommentDict | OggOpusVComment, tag: TagSchema) -> bool:
+    changed = False
+    for key in ("title", "artist", "album"):
+        value = tag[key]
+        if value and tags.get(key) != [value]:
+            tags[key] = [value]
+            changed = True
+    if tag["cover"]:
+        picture = Picture()
+        picture.type = 3  # Front cover
+        picture.mime = cover_mime(tag["cover"])
+        picture.data = tag["cover"]
+        block = base64.b64encode(picture.write()).decode("ascii")
+        if tags.get("metadata_block_picture") != [block]:
+            tags["metadata_block_picture"] = [block]
+            changed = True
+    return changed
+
+
+def _tag_id3(tags: ID3, tag: TagSchema) -> bool:
+    changed = False
+    for frame, value in ((TIT2, tag["title"]), (TPE1, tag["artist"]), (TALB, tag["album"])):
+        current = tags.get(frame.__name__)
+        if value and (current is None or current.text != [value]):
+            tags.setall(frame.__name__, [frame(encoding=3, text=[value])])
+            changed = True
+    if tag["cover"]:
+        covers = tags.getall("APIC")
+        if [c.data for c in covers] != [tag["cover"]]:
+            tags.setall(
+                "APIC", [APIC(encoding=3, mime=cover_mime(tag["cover"]), type=3, data=tag["cover"])]
+            )
+            changed = True
+    return changed
+
+
+def retag_file(tag: TagSchema) -> RetagResult:
+    """
+    Update the tags and cover art of a media file in place.
+
+    Only the tag block of the file is written, the media data is left as is. Files whose tags
+    already match are not written at all.
+
+    Parameters:
+        tag: Path of the file and its tags. Empty tags are left unchanged.
+    """
+    path = tag["path"]
+    try:
+        media = mutagen.File(path)
+        if media is None:
+            return {"path": path, "changed": False, "problem": "Unsupported container"}
+        if media.tags is None:
+            media.add_tags()
+        if isinstance(media.tags, MP4Tags):
+            changed = _tag_mp4(media.tags, tag)
+        elif isinstance(media.tags, (OggVCommentDict, OggOpusVComment)):
+            changed = _tag_vorbis(media.tags, tag)
+        elif isinstance(media.tags, ID3):
+            changed = _tag_id3(media.tags, tag)
+        else:
+            return {"path": path, "changed": False, "problem": "Unsupported tag format"}
+        if changed:
+            media.save()
+    except (mutagen.MutagenError, OSError) as e:
+        return {"path": path, "changed": False, "problem": str(e) or type(e).__name__}
+    return {"path": path, "changed": changed, "problem": ""}
+
+
+def summary(results: list[RetagResult], files: int) -> None:
+    """Print a summary of a retag and the files that could not be retagged."""
+    failed = [result for result in results if result["problem"]]
+    changed = sum(result["changed"] for result in results)
+    InfoTable(
+        "Retag",
+        [
+            ("Files", str(files)),
+            ("Matched", str(len(results))),
+            ("Retagged", str(changed)),
+            ("Unchanged", str(len(results) - changed - len(failed))),
+            ("Failed", str(len(failed))),
+        ],
+    ).print()
+    if failed:
+        InfoTable(
+            "Failed Retag", [(result["path"], result["problem"]) for result in failed]
+        ).print()
+    elif not results:
+        Print.warn("No files matched the source.")
@@ -0,0 +1,185 @@
+import json
+import os
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Event, Lock
+from typing import TYPE_CHECKING, Any, cast
+from yt_dlp.downloader import PROTOCOL_MAP, FileDownloader  # pyright: ignore[reportAttributeAccessIssue]
+from yt_dlp.downloader.http import HttpFD
+from yt_dlp.networking import Request
+from yt_dlp.networking.exceptions import TransportError
+from yt_dlp.postprocessor.common import PostProcessor
+
+if TYPE_CHECKING:
+    from yt_dlp import YoutubeDL
+    from yt_dlp.downloader.common import _FileDownloaderParams
+    from yt_dlp.extractor.common import _InfoDict
+
+PROTOCOL = "multidl_segmented"
+
+
+class RangeNotSupported(Exception):
+    """Raised when the server ignores HTTP Range requests."""
+
+
+class SegmentedFD(FileDownloader):
+    """
+    Downloads a single file over several connections using HTTP Range requests.
+
+    The `.part` file is preallocated and every segment is written at its own offset. Finished
+    segments are recorded in a `.segments` file next to it, so an interrupted download resumes
+    segment by segment.
+    """
+
+    # Set by FileDownloader, but missing from the yt-dlp type stubs
+    ydl: "YoutubeDL"
+    _progress_hooks: list[Callable[[Any], object]]
+    _hook_progress: Callable[[dict, "_InfoDict"], None]
+
+    def _load_state(self, tmpfilename: str, state_path: str, total: int) -> set[int]:
+        """Load finished segments, or preallocate a fresh `.part` file."""
+        if os.path.isfile(tmpfilename) and os.path.getsize(tmpfilename) == total:
+            try:
+                with open(state_path) as f:
+                    return set(json.load(f))
+            except (OSError, ValueError):
+                pass
+        with open(tmpfilename, "wb") as f:
+            f.truncate(total)
+        return set()
+
+    def real_download(self, filename: str, info_dict: "_InfoDict") -> bool | None:
+        # SegmentedPP only routes formats with a URL and a known size here
+        info = cast(dict, info_dict)
+        url: str = info["url"]
+        total: int = info["filesize"]
+        count, size = info["multidl_segments"]
+        headers = dict(info.get("http_headers") or {})
+        params = cast("_FileDownloaderParams", self.params or {})
+        retries = params.get("retries", 10)
+        retry_sleep = params.get("retry_sleep_functions", {}).get("http")
+        tmpfilename = self.temp_name(filename)
+        state_path = f"{tmpfilename}.segments"
+
+        done = self._load_state(tmpfilename, state_path, total)
+        segments = [
+            (index, start, min(start + size, total) - 1)
+            for index, start in enumerate(range(0, total, size))
+        ]
+        lock = Lock()
+        aborted = Event()
+        started = time.time()
+        progress = {
+            "downloaded_bytes": sum(end - start + 1 for i, start, end in segments if i in done)
+        }
+
+        def report(status: str):
+            elapsed = time.time() - started
+            downloaded = progress["downloaded_bytes"]
+            speed = self.calc_speed(started, time.time(), downloaded)
+            self._hook_progress(
+                {
+                    "status": status,
+                    "filename": filename,
+                    "tmpfilename": tmpfilename,
+                    "downloaded_bytes": downloaded,
+                    "total_bytes": total,
+                    "elapsed": elapsed,
+                    "speed": speed,
+                    "eta": (total - downloaded) / speed if speed else None,
+                },
+                info_dict,
+            )
+
+        def fetch(index: int, start: int, end: int):
+            for attempt in range(retries + 1):
+                written = 0
+                try:
+                    # The yt-dlp stubs still type urlopen with urllib requests
+                    request: Any = Request(
+                        url, headers={**headers, "Range": f"bytes={start}-{end}"}
+                    )
+                    with self.ydl.urlopen(request) as response, open(tmpfilename, "r+b") as f:
+                        if response.status != 206:
+                            raise RangeNotSupported(url)
+                        f.seek(start)
+                        while not aborted.is_set() and (chunk := response.read(1 << 16)):
+                            f.write(chunk)
+                            written += len(chunk)
+                            with lock:
+                                progress["downloaded_bytes"] += len(chunk)
+                                report("downloading")
+                    if aborted.is_set():
+                        return
+                    if written != end - start + 1:
+                        raise TransportError(f"Segment {index} ended early")
+                    with lock:
+                        done.add(index)
+                        with open(state_path, "w") as f:
+                            json.dump(sorted(done), f)
+                    return
+                except (TransportError, OSError):
+                    with lock:
+                        progress["downloaded_bytes"] -= written
+                    if attempt == retries:
+                        raise
+                    delay = cast(float | None, retry_sleep(n=attempt) if retry_sleep else None)
+                    time.sleep(min(2**attempt, 30) if delay is None else delay)
+
+        pending = [segment for segment in segments if segment[0] not in done]
+        try:
+            with ThreadPoolExecutor(max_workers=count) as pool:
+                futures = [pool.submit(fetch, *segment) for segment in pending]
+                try:
+                    # The first failing segment is raised as soon as it fails
+                    for future in as_completed(futures):
+                        future.result()
+                except BaseException:
+                    # An aborted file stops fetching, instead of finishing its queued segments
+                    aborted.set()
+                    pool.shutdown(cancel_futures=True)
+                    raise
+        except RangeNotSupported:
+            self.try_remove(tmpfilename)
+            self.try_remove(state_path)
+            fallback = HttpFD(self.ydl, params)
+            for hook in self._progress_hooks:
+                fallback.add_progress_hook(hook)
+            return fallback.real_download(filename, info_dict)
+
+        self.try_rename(tmpfilename, filename)
+        self.try_remove(state_path)
+        report("finished")
+        return True
+
+
+class SegmentedPP(PostProcessor):
+    """
+    Routes plain HTTP formats with a known size through `SegmentedFD`.
+
+    Parameters:
+        segments: Number of concurrent connections per file.
+        segment_size: Size of each Range request in bytes.
+    """
+
+    def __init__(self, segments: int, segment_size: int):
+        super().__init__(None)
+        self.segments = segments
+        self.segment_size = segment_size
+
+    def run(self, information):
+        formats = cast(list[dict], information.get("requested_formats") or [information])
+        for f in formats:
+            if (
+                f.get("protocol") in ("http", "https")
+                and (f.get("filesize") or 0) >= 2 * self.segment_size
+            ):
+                f["protocol"] = PROTOCOL
+                f["multidl_segments"] = (self.segments, self.segment_size)
+        if information.get("requested_formats"):
+            cast(dict, information)["protocol"] = "+".join(f["protocol"] for f in formats)
+        return [], information
+
+
+PROTOCOL_MAP[PROTOCOL] = SegmentedFD
@@ -0,0 +1,233 @@
+import os
+import posixpath
+import shutil
+import tempfile
+from ..term import InfoTable, Print, ProgressBar
+from ..utils import link_file, sanitize_path
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from rich.progress import TaskID
+from threading import Condition, Lock
+from typing import cast
+
+# Files uploaded at once, and parts uploaded at once for each file
+UPLOADS = 4
+PART_THREADS = 4
+PART_SIZE = 16 * 1024 * 1024
+
+
+class Sink(ABC):
+    """
+    Where finished files are stored.
+
+    Downloads are written to the local directory given by `dir`. Each finished file is then handed
+    to `store`, which returns its final location.
+    """
+
+    # Whether files end up off this machine, where they can't be linked, verified or archived
+    remote = False
+
+    @abstractmethod
+    def dir(self, playlist: str) -> str:
+        """
+        Get the local directory the files of a playlist are written to.
+
+        Parameters:
+            playlist: Playlist folder name, with `%dir%` as path separator.
+        """
+
+    @abstractmethod
+    def store(self, path: str, playlist: str) -> str:
+        """
+        Store a finished file.
+
+        Parameters:
+            path: Path of the finished file, in `dir(playlist)`.
+            playlist: Playlist folder name of the file.
+
+        Returns:
+            Final location of the file.
+        """
+
+    @abstractmethod
+    def link(self, location: str, playlist: str) -> None:
+        """
+        Make a stored file appear in another playlist folder as well.
+
+        Parameters:
+            location: Final location of the file, as returned by `store`.
+            playlist: Playlist folder name to add the file to.
+        """
+
+    def flush(self) -> None:  # noqa: B027
+        """Wait until every stored file has reached its final location."""
+
+
+class LocalSink(Sink):
+    """
+    Stores files on the local filesystem, where they are downloaded to.
+
+    Parameters:
+        root: Directory the playlist folders are created in.
+    """
+
+    def __init__(self, root: str = "."):
+        self.root = root
+
+    def dir(self, playlist: str) -> str:
+        return os.path.join(self.root, sanitize_path(playlist))
+
+    def store(self, path: str, playlist: str) -> str:
+        return path
+
+    def link(self, location: str, playlist: str) -> None:
+        dst = os.path.join(self.dir(playlist), os.path.basename(location))
+        if not os.path.exists(dst):
+            link_file(location, dst)
+
+
+class S3Sink(Sink):
+    """
+    Uploads files to an S3-compatible object store while the next files download.
+
+    Files are staged in a local scratch directory and uploaded as concurrent multipart transfers.
+    Each staged file is deleted as soon as its upload completes. Once `limit` bytes are staged,
+    finished downloads wait for uploads to free space before handing over their file.
+
+    Credentials and the endpoint are read by boto3 from the environment, e.g.
+    `AWS_ACCESS_KEY_ID`, `AWS_SECRET_ACCESS_KEY` and `AWS_ENDPOINT_URL` for MinIO.
+
+    Parameters:
+        url: Destination as `s3://bucket/prefix`.
+        scratch_dir: Directory to stage files in. The system temp directory is used if not set.
+        limit: Most bytes staged at once, 0 for no limit.
+    """
+
+    remote = True
+
+    def __init__(self, url: str, scratch_dir: str | None = None, limit: int = 0):
+        try:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+        except ImportError:
+            Print.error("Uploading to S3 requires boto3. Install [cyan]multidl\\[s3][/].")
+            exit(1)
+        self.bucket, _, prefix = url.removeprefix("s3://").partition("/")
+        if not self.bucket:
+            Print.error(f"Invalid S3 URL [cyan]{url}[/], expected [cyan]s3://bucket/prefix[/].")
+            exit(1)
+        self.prefix = prefix.strip("/")
+        self.client = boto3.client("s3")
+        self.transfer = TransferConfig(
+            multipart_threshold=PART_SIZE,
+            multipart_chunksize=PART_SIZE,
+            max_concurrency=PART_THREADS,
+        )
+        if scratch_dir:
+            os.makedirs(scratch_dir, exist_ok=True)
+        self.staging = tempfile.mkdtemp(prefix="multidl-s3-", dir=scratch_dir)
+        self.limit = limit
+        self.staged = 0
+        self.space = Condition()
+        self.pool = ThreadPoolExecutor(max_workers=UPLOADS)
+        self.lock = Lock()
+        self.uploads: dict[str, Future] = {}
+        self.failed: dict[str, str] = {}
+        self.progress = ProgressBar()
+        self.task: TaskID | None = None
+
+    def dir(self, playlist: str) -> str:
+        return os.path.join(self.staging, sanitize_path(playlist))
+
+    def key(self, playlist: str, name: str) -> str:
+        """Get the object key of a file in a playlist folder."""
+        return posixpath.normpath("/".join((self.prefix, sanitize_path(playlist), name))).lstrip(
+            "/"
+        )
+
+    def store(self, path: str, playlist: str) -> str:
+        size = os.path.getsize(path)
+        with self.space:
+            # A file larger than the limit still goes through once nothing else is staged
+            while self.limit and self.staged and self.staged + size > self.limit:
+                self.space.wait()
+            self.staged += size
+        key = self.key(playlist, os.path.basename(path))
+        location = f"s3://{self.bucket}/{key}"
+        self._submit(location, self._upload, path, key, size)
+        return location
+
+    def _submit(self, location: str, fn, *args) -> None:
+        """Queue a transfer to a location, adding it to the upload progress."""
+        with self.lock:
+            description = f"[yellow]Uploading to[/] [cyan]s3://{self.bucket}/{self.prefix}[/]"
+            if self.task is None:
+                self.task = self.progress.playlist.add_task(description, total=0)
+            self.progress.playlist.update(
+                self.task, description=description, total=len(self.uploads) + 1
+            )
+            self.uploads[location] = self.pool.submit(self._transfer, location, fn, *args)
+
+    def _transfer(self, location: str, fn, *args) -> None:
+        try:
+            fn(*args)
+        except Exception as e:
+            self.failed[location] = str(e) or type(e).__name__
+            raise
+        finally:
+            self.progress.playlist.update(cast(TaskID, self.task), advance=1)
+
+    def _upload(self, path: str, key: str, size: int) -> None:
+        try:
+            self.client.upload_file(path, self.bucket, key, Config=self.transfer)
+            # The staged file is only removed once it's uploaded, so nothing is lost on failure
+            os.remove(path)
+        finally:
+            with self.space:
+                self.staged -= size
+                self.space.notify_all()
+
+    def link(self, location: str, playlist: str) -> None:
+        upload = self.uploads[location]
+        key = self.key(playlist, posixpath.basename(location))
+
+        def copy():
+            # Copied on the server once the upload is done, nothing is uploaded twice
+            upload.result()
+            source = {"Bucket": self.bucket, "Key": location.removeprefix(f"s3://{self.bucket}/")}
+            self.client.copy(source, self.bucket, key, Config=self.transfer)
+
+        self._submit(f"s3://{self.bucket}/{key}", copy)
+
+    def flush(self) -> None:
+        with self.lock:
+            uploads = list(self.uploads.values())
+        for upload in uploads:
+            try:
+                upload.result()
+            except Exception:
+                pass
+        if self.task is not None:
+            self.progress.playlist.update(
+                self.task,
+                description=f"[green]Uploaded to[/] [cyan]s3://{self.bucket}/{self.prefix}[/]",
+            )
+        if self.failed:
+            InfoTable("Failed Upload", list(self.failed.items())).print()
+            Print.warn(f"Files that failed to upload are kept in [cyan]{self.staging}[/].")
+        else:
+            shutil.rmtree(self.staging, ignore_errors=True)
+
+
+def open_sink(output: str | None, scratch_dir: str | None = None, limit: int = 0) -> Sink:
+    """
+    Get the sink of an output destination.
+
+    Parameters:
+        output: `s3://bucket/prefix` for S3, or a local directory. The current directory if None.
+        scratch_dir: Directory to stage files in before uploading.
+        limit: Most bytes staged at once before uploading, 0 for no limit.
+    """
+    if output and output.startswith("s3://"):
+        return S3Sink(output, scratch_dir, limit)
+    return LocalSink(output or ".")
@@ -3,9 +3,13 @@ import requests
 import spotipy
 from ..config import Config
 from ..term import InfoTable, Print, ProgressBar, SpotifyTOSTable
-from .helpers import Downloader, DownloadTaskSchema
-from types import FunctionType
-from typing import Literal
+from .helpers import Downloader, DownloadOptions, DownloadTaskSchema, drain
+from .spotify_client import SpotifyClient
+from collections.abc import Callable, Iterator
+from rich.progress import TaskID
+from typing import Literal, TypeVar
+
+T = TypeVar("T")
 
 
 class Credentials:
@@ -56,9 +60,11 @@ class Spotify:
 
     Parameters:
         query: The search query for the media.
+        budget: Maximum number of concurrent Spotify API requests. Defaults to
+            `[performance] spotify-requests` in the config.
     """
 
-    def __init__(self, url: str):
+    def __init__(self, url: str, budget: int | None = None):
         self.url = url
         self.progress = ProgressBar()
 
@@ -98,15 +104,16 @@ class Spotify:
         data = config.load()
 
         # Initialize Spotify client
-        self.sp = spotipy.Spotify(
+        self.sp = SpotifyClient(
             auth_manager=spotipy.SpotifyClientCredentials(
                 client_id=data["spotify-credentials"]["client-id"],
                 client_secret=data["spotify-credentials"]["client-secret"],
                 cache_handler=spotipy.cache_handler.MemoryCacheHandler(),
-            )
+            ),
+            budget=budget or data["performance"]["spotify-requests"],
         )
 
-    def _fetch_info(self, fetch_fn: FunctionType) -> dict:
+    def _fetch_info(self, fetch_fn: Callable[[], T | None]) -> T:
         """Unified method to fetch Spotify info with progress bar and error handling."""
         with self.progress.live:
             task = self.progress.search.add_task("[yellow]Fetching[/]", total=1)
@@ -178,10 +185,14 @@ class Spotify:
         ]
         InfoTable("Spotify Track", data).print()
 
+    @property
+    def user_id(self) -> str:
+        """ID of the user in a profile URL."""
+        return self.url.split("/")[-1].split("?")[0]
+
     def info_user(self) -> None:
         """Get spotify profile info."""
-        user_id = self.url.split("/")[-1]
-        user = self._fetch_info(lambda: self.sp.user(user_id))
+        user = self._fetch_info(lambda: self.sp.user(self.user_id))
         data: list[tuple[str, str]] = [
             ("Name", user["display_name"]),
             ("Followers", user["followers"]["total"]),
@@ -193,30 +204,50 @@ class Spotify:
         ]
         InfoTable("Spotify Profile", data).print()
 
-    def download_pl(self, threads: int | Literal["max"] = 5) -> None:
+    def info_artist(self) -> None:
+        """Get spotify artist info."""
+        artist = self._fetch_info(lambda: self.sp.artist(self.url))
+        releases = self._fetch_info(
+            lambda: self.sp.artist_albums(
+                self.url, include_groups="album,single,compilation", limit=1
+            )
+        )
+        image = artist["images"][0]["url"] if artist["images"] else ""
+        data: list[tuple[str, str]] = [
+            ("Name", artist["name"]),
+            ("Followers", artist["followers"]["total"]),
+            ("Genres", ", ".join(artist["genres"])),
+            (
+                "URL",
+                f"[link={artist['external_urls']['spotify']}]{artist['external_urls']['spotify']}[/]",
+            ),
+            ("Image", f"[link={image}]{image}[/]" if image else ""),
+            ("Releases", releases["total"]),
+        ]
+        InfoTable("Spotify Artist", data).print()
+
+    def download_pl(
+        self, threads: int | Literal["max"] = 5, options: DownloadOptions | None = None
+    ) -> None:
         """Download spotify playlist."""
         pl = self._fetch_info(lambda: self.sp.playlist(self.url))
+        items = self._fetch_info(lambda: self.sp.playlist_tracks_all(pl))
         with self.progress.live:
             task = self.progress.playlist.add_task(
                 f"[yellow]Downloading[/] [cyan]{pl['name']}[/]", total=pl["tracks"]["total"]
             )
-            tasks = [
-                DownloadTaskSchema(
-                    query=track["track"]["name"],
-                    title=track["track"]["name"],
-                    type="audio",
-                    cover_url=track["track"]["album"]["images"][0]["url"],
-                    artist=track["track"]["artists"][0]["name"],
-                    album=track["track"]["album"]["name"],
-                    playlist=pl["name"],
-                )
-                for track in pl["tracks"]["items"]
-            ]
+            # Track objects are dropped as their tasks are built
+            tasks = (
+                self._track_task(track["track"], pl["name"])
+                for track in drain(items)
+                if track["track"]
+            )
             Downloader(
                 tasks=tasks,
                 progress=self.progress,
                 playlist_task=task,
                 threads=threads,
+                options=options,
             ).download()
             self.progress.playlist.update(
                 task,
@@ -224,14 +255,88 @@ class Spotify:
                 completed=pl["tracks"]["total"],
             )
 
-    def download_album(self, threads: int | Literal["max"] = 5) -> None:
+    @staticmethod
+    def _track_task(track: dict, playlist: str) -> DownloadTaskSchema:
+        """Build the task of a playlist track."""
+        return DownloadTaskSchema(
+            query=track["name"],
+            title=track["name"],
+            type="audio",
+            cover_url=track["album"]["images"][0]["url"] if track["album"]["images"] else "",
+            artist=track["artists"][0]["name"],
+            album=track["album"]["name"],
+            playlist=playlist,
+            duration=track["duration_ms"] / 1000,
+        )
+
+    def pl_marker(self) -> dict | None:
+        """Get a change marker of the playlist: its snapshot ID, in a single request."""
+        try:
+            pl = self.sp.playlist(self.url, fields="snapshot_id")
+        except spotipy.SpotifyException:
+            return None
+        return {"snapshot_id": pl["snapshot_id"]} if pl and pl.get("snapshot_id") else None
+
+    def pl_entries(self, playlist: str) -> tuple[str, dict[str, DownloadTaskSchema]]:
+        """
+        Enumerate the playlist.
+
+        Parameters:
+            playlist: Folder to download the tracks into.
+
+        Returns:
+            The playlist name, and the task of each track keyed by track ID.
+        """
+        pl = self._fetch_info(lambda: self.sp.playlist(self.url))
+        items = self._fetch_info(lambda: self.sp.playlist_tracks_all(pl))
+        entries: dict[str, DownloadTaskSchema] = {}
+        for item in drain(items):
+            track = item["track"]
+            if not track or track.get("type") != "track":
+                continue
+            # Local files have no ID
+            key = track.get("id") or f"{track['name']}:{track['artists'][0]['name']}"
+            entries[key] = self._track_task(track, playlist)
+        return pl["name"], entries
+
+    def album_entries(self, playlist: str) -> tuple[str, dict[str, DownloadTaskSchema]]:
+        """
+        Enumerate the album.
+
+        Parameters:
+            playlist: Folder to download the tracks into.
+
+        Returns:
+            The album name, and the task of each track keyed by track ID.
+        """
+        album = self._fetch_info(lambda: self.sp.album(self.url))
+        songs = self._fetch_info(lambda: self.sp.album_tracks_all(album))
+        entries = {
+            song["id"]: DownloadTaskSchema(
+                query=song["name"],
+                title=song["name"],
+                type="audio",
+                cover_url=album["images"][0]["url"] if album["images"] else "",
+                artist=song["artists"][0]["name"],
+                album=album["name"],
+                playlist=playlist,
+                duration=song["duration_ms"] / 1000,
+            )
+            for song in drain(songs)
+        }
+        return album["name"], entries
+
+    def download_album(
+        self, threads: int | Literal["max"] = 5, options: DownloadOptions | None = None
+    ) -> None:
         """Download spotify album."""
         album = self._fetch_info(lambda: self.sp.album(self.url))
+        songs = self._fetch_info(lambda: self.sp.album_tracks_all(album))
         with self.progress.live:
             task = self.progress.playlist.add_task(
                 f"[yellow]Downloading[/] [cyan]{album['name']}[/]", total=album["tracks"]["total"]
             )
-            tasks = [
+            tasks = (
                 DownloadTaskSchema(
                     query=song["name"],
                     title=song["name"],
@@ -240,14 +345,16 @@ class Spotify:
                     artist=song["artists"][0]["name"],
                     album=album["name"],
                     playlist=album["name"],
+                    duration=song["duration_ms"] / 1000,
                 )
-                for song in album["tracks"]["items"]
-            ]
+                for song in drain(songs)
+            )
             Downloader(
                 tasks=tasks,
                 progress=self.progress,
                 playlist_task=task,
                 threads=threads,
+                options=options,
             ).download()
             self.progress.playlist.update(
                 task,
@@ -255,7 +362,9 @@ class Spotify:
                 completed=album["tracks"]["total"],
             )
 
-    def download_track(self, threads: int | Literal["max"] = 5) -> None:
+    def download_track(
+        self, threads: int | Literal["max"] = 5, options: DownloadOptions | None = None
+    ) -> None:
         """Download spotify song."""
         song = self._fetch_info(lambda: self.sp.track(self.url))
         with self.progress.live:
@@ -268,8 +377,143 @@ class Spotify:
                         cover_url=song["album"]["images"][0]["url"],
                         artist=song["artists"][0]["name"],
                         album=song["album"]["name"],
+                        duration=song["duration_ms"] / 1000,
                     )
                 ],
                 progress=self.progress,
                 threads=threads,
+                options=options,
             ).download()
+
+    def download_artist(
+        self, threads: int | Literal["max"] = 5, options: DownloadOptions | None = None
+    ) -> None:
+        """Download the albums, singles and compilations of a spotify artist."""
+        artist = self._fetch_info(lambda: self.sp.artist(self.url))
+        releases = self._fetch_info(lambda: self.sp.artist_albums_all(artist["id"]))
+        total = sum(release["total_tracks"] for release in releases)
+        with self.progress.live:
+            task = self.progress.playlist.add_task(
+                f"[yellow]Downloading[/] [cyan]{artist['name']}[/]", total=total
+            )
+            Downloader(
+                tasks=self._artist_tasks(artist, releases, task),
+                progress=self.progress,
+                playlist_task=task,
+                threads=threads,
+                options=options,
+            ).download()
+            self.progress.playlist.update(
+                task,
+                description=f"[green]Downloaded[/] [cyan]{artist['name']}[/]",
+                completed=total,
+            )
+
+    def _artist_tasks(
+        self, artist: dict, releases: list[dict], task: TaskID
+    ) -> Iterator[DownloadTaskSchema]:
+        """
+        Yield the tasks of an artist's releases as each album resolves.
+
+        A track released on several albums is downloaded once, into the first album it appears on.
+
+        Parameters:
+            artist: The artist.
+            releases: The albums, singles and compilations of the artist.
+            task: Progress task of the artist, advanced for the tracks that are skipped.
+        """
+        seen: set[str] = set()
+        for album in self.sp.albums_all([release["id"] for release in releases]):
+            songs = self.sp.album_tracks_all(album)
+            yielded = 0
+            # Simplified album tracks have no ISRC, full track objects do
+            for song in self.sp.tracks_all([song["id"] for song in songs if song.get("id")]):
+                key = song.get("external_ids", {}).get("isrc") or (
+                    f"{song['name'].lower()}:{song['artists'][0]['name'].lower()}"
+                )
+                if key in seen:
+                    continue
+                seen.add(key)
+                yielded += 1
+                yield DownloadTaskSchema(
+                    query=song["name"],
+                    title=song["name"],
+                    type="audio",
+                    cover_url=album["images"][0]["url"] if album["images"] else "",
+                    artist=song["artists"][0]["name"],
+                    album=album["name"],
+                    playlist=f"{artist['name']}%dir%{album['name']}",
+                    duration=song["duration_ms"] / 1000,
+                )
+            # Skipped tracks, e.g. those already on an earlier release, still count in the total
+            self.progress.playlist.update(task, advance=max(album["total_tracks"] - yielded, 0))
+
+    def download_user(
+        self, threads: int | Literal["max"] = 5, options: DownloadOptions | None = None
+    ) -> None:
+        """Download every public playlist of a spotify user in one run."""
+        user = self._fetch_info(lambda: self.sp.user(self.user_id))
+        name = user["display_name"] or user["id"]
+        playlists = self._fetch_info(
+            lambda: self.sp.paginate(
+                self.sp.user_playlists(user["id"], limit=50),
+                lambda offset, limit: self.sp.user_playlists(
+                    user["id"], limit=limit, offset=offset
+                ),
+            )
+        )
+        tracks = self._fetch_info(lambda: self._user_tracks(playlists))
+        total = len(tracks)
+        with self.progress.live:
+            task = self.progress.playlist.add_task(
+                f"[yellow]Downloading[/] [cyan]{name}[/] ({len(playlists)} playlists)", total=total
+            )
+            # Each track is downloaded into its first playlist and linked into the others
+            tasks = (
+                DownloadTaskSchema(
+                    query=track["name"],
+                    title=track["name"],
+                    type="audio",
+                    cover_url=track["album"]["images"][0]["url"]
+                    if track["album"]["images"]
+                    else "",
+                    artist=track["artists"][0]["name"],
+                    album=track["album"]["name"],
+                    playlist=folders[0],
+                    duration=track["duration_ms"] / 1000,
+                    links=folders[1:] or None,
+                )
+                for track, folders in drain(tracks)
+            )
+            Downloader(
+                tasks=tasks,
+                progress=self.progress,
+                playlist_task=task,
+                threads=threads,
+                options=options,
+            ).download()
+            self.progress.playlist.update(
+                task,
+                description=f"[green]Downloaded[/] [cyan]{name}[/] ({len(playlists)} playlists)",
+                completed=total,
+            )
+
+    def _user_tracks(self, playlists: list[dict]) -> list[tuple[dict, tuple[str, ...]]]:
+        """
+        Enumerate the tracks of several playlists concurrently, each track once.
+
+        Returns:
+            Tracks in playlist order, with the folders of every playlist they appear in.
+        """
+        found: dict[str, tuple[dict, list[str]]] = {}
+        pages = self.sp.map(lambda pl: self.sp.playlist_items_all(pl["id"]), playlists)
+        for pl, items in zip(playlists, pages, strict=True):
+            for item in items:
+                track = item.get("track")
+                if not track or track.get("type") != "track":
+                    continue
+                key = track.get("id") or f"{track['name']}:{track['artists'][0]['name']}"
+                _, folders = found.setdefault(key, (track, []))
+                if pl["name"] not in folders:
+                    folders.append(pl["name"])
+        return [(track, tuple(folders)) for track, folders in found.values()]
@@ -0,0 +1,170 @@
+import logging
+import requests
+import requests.adapters
+import spotipy
+import time
+from ..profiling import PROFILER
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock
+from typing import Any, cast
+
+# Most IDs the Web API takes in one request
+ALBUMS_PER_REQUEST = 20
+TRACKS_PER_REQUEST = 50
+
+# Rate limits are handled by the client, keep spotipy's warnings off the progress display
+logging.getLogger("spotipy").addHandler(logging.NullHandler())
+
+
+class SpotifyClient(spotipy.Spotify):
+    """
+    Spotify Web API client with a shared connection pool and a request budget.
+
+    At most `budget` requests are in flight at once, across all threads. A 429 response pauses
+    every thread for its `Retry-After` before the request is retried, instead of each thread
+    backing off on its own.
+
+    Parameters:
+        auth_manager: Spotipy auth manager.
+        budget: Maximum number of concurrent requests.
+        retries: Number of times a rate-limited request is retried.
+    """
+
+    def __init__(
+        self, auth_manager: spotipy.SpotifyClientCredentials, budget: int = 8, retries: int = 5
+    ):
+        self.budget = max(budget, 1)
+        self.rate_retries = retries
+        self.slots = BoundedSemaphore(self.budget)
+        self.lock = Lock()
+        self.resume_at = 0.0
+        # 429s are handled below, server errors by the session
+        super().__init__(auth_manager=auth_manager, status_forcelist=(500, 502, 503, 504))
+
+    def _build_session(self):
+        super()._build_session()
+        # spotipy builds a requests.Session here, its stubs type it as the requests.api module
+        session = cast(requests.Session, self._session)
+        retry = cast(requests.adapters.HTTPAdapter, session.get_adapter("https://")).max_retries
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.budget, max_retries=retry
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+    def _internal_call(self, method, url, payload, params):
+        for attempt in range(self.rate_retries + 1):
+            with self.lock:
+                wait = self.resume_at - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                with self.slots, PROFILER.stage("spotify-api"):
+                    return super()._internal_call(method, url, payload, params)
+            except spotipy.SpotifyException as e:
+                if e.http_status != 429 or attempt == self.rate_retries:
+                    raise
+                retry_after = float((e.headers or {}).get("Retry-After") or 2**attempt)
+                with self.lock:
+                    self.resume_at = max(self.resume_at, time.monotonic() + retry_after)
+
+    def map(self, fn: Callable, items: list) -> Iterator:
+        """Run a request for each item concurrently within the budget, yielding results in order."""
+        with ThreadPoolExecutor(max_workers=self.budget) as pool:
+            yield from pool.map(fn, items)
+
+    def paginate(
+        self, first: dict[str, Any] | None, fetch: Callable[[int, int], dict[str, Any] | None]
+    ) -> list[dict]:
+        """
+        Collect every item of a paged result, fetching the remaining pages concurrently.
+
+        Parameters:
+            first: First page of the result. None, as spotipy returns for an empty response, has
+                no items.
+            fetch: Fetches the page at an offset with a limit.
+        """
+        if first is None:
+            return []
+        limit = first["limit"] or len(first["items"]) or 50
+        offsets = list(range(first["offset"] + len(first["items"]), first["total"], limit))
+        items = list(first["items"])
+        for page in self.map(lambda offset: fetch(offset, limit), offsets):
+            items.extend(page["items"] if page else [])
+        return items
+
+    def playlist_tracks_all(self, playlist: dict) -> list[dict]:
+        """
+        Get every item of a playlist fetched with `playlist`.
+
+        Parameters:
+            playlist: The playlist object, holding the first page of its tracks.
+        """
+        return self.paginate(
+            playlist["tracks"],
+            lambda offset, limit: self.playlist_items(playlist["id"], limit=limit, offset=offset),
+        )
+
+    def playlist_items_all(self, playlist_id: str) -> list[dict]:
+        """
+        Get every item of a playlist by its ID.
+
+        Parameters:
+            playlist_id: Playlist ID, URI or URL.
+        """
+        return self.paginate(
+            self.playlist_items(playlist_id, limit=100),
+            lambda offset, limit: self.playlist_items(playlist_id, limit=limit, offset=offset),
+        )
+
+    def album_tracks_all(self, album: dict) -> list[dict]:
+        """
+        Get every track of an album fetched with `album` or `albums`.
+
+        Parameters:
+            album: The album object, holding the first page of its tracks.
+        """
+        return self.paginate(
+            album["tracks"],
+            lambda offset, limit: self.album_tracks(album["id"], limit=limit, offset=offset),
+        )
+
+    def _batched(self, fetch: Callable, key: str, ids: list[str], size: int) -> Iterator[dict]:
+        """Fetch objects by ID in batches of `size`, running the batches concurrently."""
+        batches = [ids[i : i + size] for i in range(0, len(ids), size)]
+        for page in self.map(fetch, batches):
+            yield from (item for item in page[key] if item)
+
+    def albums_all(self, ids: list[str]) -> Iterator[dict]:
+        """
+        Get full album objects, several per request and the requests concurrently.
+
+        Parameters:
+            ids: Album IDs, URIs or URLs.
+        """
+        return self._batched(self.albums, "albums", ids, ALBUMS_PER_REQUEST)
+
+    def tracks_all(self, ids: list[str]) -> Iterator[dict]:
+        """
+        Get full track objects, several per request and the requests concurrently.
+
+        Parameters:
+            ids: Track IDs, URIs or URLs.
+        """
+        return self._batched(self.tracks, "tracks", ids, TRACKS_PER_REQUEST)
+
+    def artist_albums_all(self, artist_id: str) -> list[dict]:
+        """
+        Get every album, single and compilation of an artist.
+
+        Parameters:
+            artist_id: Artist ID, URI or URL.
+        """
+        groups = "album,single,compilation"
+        return self.paginate(
+            self.artist_albums(artist_id, include_groups=groups, limit=50),
+            lambda offset, limit: self.artist_albums(
+                artist_id, include_groups=groups, limit=limit, offset=offset
+            ),
+        )
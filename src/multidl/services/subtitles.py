@@ -0,0 +1,126 @@
+import os
+import tempfile
+import time
+from ..config import DEFAULT_SUBTITLE_CACHE
+from ..profiling import PROFILER
+from ..utils import sanitize_path
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock
+from typing import Any
+from yt_dlp import YoutubeDL
+from yt_dlp.networking import Request
+from yt_dlp.networking.exceptions import HTTPError, RequestError
+
+# Protocols of subtitle tracks that are fetched in one plain request
+PLAIN_PROTOCOLS = (None, "http", "https")
+
+
+def is_translated(track: dict) -> bool:
+    """Whether a subtitle track is machine-translated from another language by YouTube."""
+    return "tlang=" in (track.get("url") or "")
+
+
+class SubtitleFetcher:
+    """
+    Fetches the selected subtitle tracks of videos concurrently, within a request budget.
+
+    At most `budget` requests are in flight at once, across all downloads. A 429 response pauses
+    every request for its `Retry-After` instead of hammering the server further. Fetched tracks
+    are cached per video, so a re-run doesn't fetch them again, and handed to yt-dlp as data,
+    which writes and embeds them as usual.
+
+    Parameters:
+        budget: Maximum number of concurrent subtitle requests.
+        cache_dir: Directory of the subtitle cache.
+        retries: Number of times a rate-limited request is retried.
+    """
+
+    def __init__(self, budget: int = 4, cache_dir: str = DEFAULT_SUBTITLE_CACHE, retries: int = 3):
+        self.budget = max(budget, 1)
+        self.cache_dir = cache_dir
+        self.retries = retries
+        self.slots = BoundedSemaphore(self.budget)
+        self.lock = Lock()
+        self.resume_at = 0.0
+
+    def path(self, info: dict, lang: str, ext: str) -> str:
+        """Cache path of a subtitle track of a video."""
+        video = sanitize_path(f"{info.get('extractor_key', 'Generic')}-{info['id']}")
+        return os.path.join(self.cache_dir, video, sanitize_path(f"{lang}.{ext}"))
+
+    def fetch(self, ydl: YoutubeDL, info: dict, translated: bool = True) -> None:
+        """
+        Fetch the requested subtitles of a resolved entry into its info dict.
+
+        Tracks that fail are dropped, so yt-dlp doesn't fetch them again one by one.
+
+        Parameters:
+            ydl: The YoutubeDL instance downloading the entry.
+            info: Resolved entry with `requested_subtitles`, modified in place.
+            translated: Keep tracks machine-translated from another language.
+        """
+        requested: dict[str, dict] = info.get("requested_subtitles") or {}
+        if not translated:
+            for lang in [lang for lang, track in requested.items() if is_translated(track)]:
+                del requested[lang]
+        tracks = [
+            (lang, track)
+            for lang, track in requested.items()
+            if track.get("data") is None and track.get("protocol") in PLAIN_PROTOCOLS
+        ]
+        if not tracks:
+            return
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(self.budget, len(tracks))) as pool:
+            data = list(pool.map(lambda t: self._track(ydl, info, *t), tracks))
+        for (lang, track), text in zip(tracks, data, strict=True):
+            if text is None:
+                del requested[lang]
+            else:
+                track["data"] = text
+        PROFILER.record("subtitles", time.perf_counter() - started)
+
+    def _track(self, ydl: YoutubeDL, info: dict, lang: str, track: dict) -> str | None:
+        """Get a subtitle track from the cache, or fetch and cache it."""
+        path = self.path(info, lang, track["ext"])
+        try:
+            with open(path, encoding="utf-8", newline="") as f:
+                return f.read()
+        except OSError:
+            pass
+        headers = track.get("http_headers") or info.get("http_headers") or {}
+        for attempt in range(self.retries + 1):
+            with self.lock:
+                wait = self.resume_at - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            # The yt-dlp stubs still type urlopen with urllib requests
+            request: Any = Request(track["url"], headers=headers)
+            try:
+                with self.slots:
+                    data = ydl.urlopen(request).read()
+                text = data.decode("utf-8", "replace")
+                self._store(path, text)
+                return text
+            except HTTPError as e:
+                if e.status != 429 or attempt == self.retries:
+                    return None
+                retry_after = e.response.get_header("Retry-After") or ""
+                delay = float(retry_after) if retry_after.isdigit() else 2**attempt
+                with self.lock:
+                    self.resume_at = max(self.resume_at, time.monotonic() + delay)
+            except RequestError:
+                return None
+        return None
+
+    @staticmethod
+    def _store(path: str, text: str) -> None:
+        """Write a fetched track to the cache in a single step. The cache is best effort."""
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with open(fd, "w", encoding="utf-8", newline="") as f:
+                f.write(text)
+            os.replace(tmp, path)
+        except OSError:
+            pass
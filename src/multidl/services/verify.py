@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import subprocess
+from ..archive import Archive
+from ..profiling import PROFILER
+from ..term import InfoTable, Print
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TypedDict
+
+MEDIA_EXTENSIONS = (".mp4", ".mkv", ".webm", ".m4a", ".ogg", ".opus", ".mp3")
+AUDIO_EXTENSIONS = (".m4a", ".ogg", ".opus", ".mp3")
+EXPECTED_STREAMS = {"audio": {"audio"}, "video": {"video"}, "default": {"video", "audio"}}
+
+
+class VerifyResult(TypedDict):
+    path: str
+    problems: list[str]
+    checksum: str
+
+
+def probe(path: str) -> dict | None:
+    """Run ffprobe on a file and return its parsed JSON output."""
+    try:
+        result = subprocess.run(
+            [
+                "ffprobe",
+                "-v",
+                "error",
+                "-print_format",
+                "json",
+                "-show_format",
+                "-show_streams",
+                path,
+            ],
+            capture_output=True,
+            text=True,
+            timeout=120,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+    try:
+        return json.loads(result.stdout)
+    except ValueError:
+        return None
+
+
+def checksum(path: str) -> str:
+    """Get the SHA-256 checksum of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def verify_file(
+    path: str, type: str | None = None, duration: float | None = None, cover: bool = True
+) -> VerifyResult:
+    """
+    Verify a downloaded file with ffprobe.
+
+    Parameters:
+        path: Path of the file.
+        type: The type of media the file was downloaded as. Guessed from the extension if not given.
+        duration: Expected duration in seconds.
+        cover: Whether the file should have embedded cover art.
+
+    Returns:
+        The problems found and the checksum of the file.
+    """
+    if type not in EXPECTED_STREAMS:
+        type = "audio" if path.lower().endswith(AUDIO_EXTENSIONS) else "default"
+    data = probe(path)
+    if data is None:
+        return {"path": path, "problems": ["Unreadable by ffprobe"], "checksum": ""}
+
+    problems: list[str] = []
+    streams = data.get("streams", [])
+    covers = [s for s in streams if s.get("disposition", {}).get("attached_pic")]
+    kinds = {s.get("codec_type") for s in streams if s not in covers}
+    for kind in sorted(EXPECTED_STREAMS[type] - kinds):
+        problems.append(f"Missing {kind} stream")
+
+    actual = float(data.get("format", {}).get("duration") or 0)
+    if duration and abs(actual - duration) > max(2.0, duration * 0.02):
+        problems.append(f"Duration is {actual:.0f}s, expected {duration:.0f}s")
+
+    # Ogg keeps its tags on the stream, other containers on the format
+    tags = {k.lower() for k in data.get("format", {}).get("tags", {})}
+    for s in streams:
+        tags.update(k.lower() for k in s.get("tags", {}))
+    if "title" not in tags:
+        problems.append("Missing title tag")
+    if cover and not covers and "metadata_block_picture" not in tags:
+        problems.append("Missing cover")
+    return {"path": path, "problems": problems, "checksum": checksum(path)}
+
+
+def timed_verify(
+    path: str, type: str | None = None, duration: float | None = None, cover: bool = True
+) -> VerifyResult:
+    """Verify a file, timing it as the 'verify' stage of the profiler."""
+    with PROFILER.stage("verify"):
+        return verify_file(path, type, duration, cover)
+
+
+class Verifier:
+    """
+    Verifies downloaded files in its own worker pool, so verification never blocks downloads.
+
+    Checksums of the verified files are recorded in the archive.
+
+    Parameters:
+        workers: Number of files to verify at once.
+    """
+
+    def __init__(self, workers: int = 2):
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.futures: list[Future[VerifyResult]] = []
+
+    def submit(
+        self,
+        path: str,
+        type: str | None = None,
+        duration: float | None = None,
+        cover: bool = True,
+    ) -> Future[VerifyResult]:
+        """
+        Queue a file for verification.
+
+        Parameters:
+            path: Path of the file.
+            type: The type of media the file was downloaded as.
+            duration: Expected duration in seconds.
+            cover: Whether the file should have embedded cover art.
+        """
+        future = self.pool.submit(timed_verify, path, type, duration, cover)
+        self.futures.append(future)
+        return future
+
+    def results(self) -> list[VerifyResult]:
+        """Wait for all queued files and return the ones that failed verification."""
+        archive = Archive()
+        bad: list[VerifyResult] = []
+        for future in self.futures:
+            result = future.result()
+            if result["checksum"]:
+                archive.set_checksum(result["path"], result["checksum"])
+            if result["problems"]:
+                bad.append(result)
+        self.pool.shutdown()
+        self.futures = []
+        return bad
+
+
+def report(bad: list[VerifyResult]) -> None:
+    """Print the files that failed verification."""
+    if not bad:
+        Print.success("All files passed verification.")
+        return
+    InfoTable(
+        "Failed Verification", [(result["path"], "; ".join(result["problems"])) for result in bad]
+    ).print()
+
+
+def scan(dir: str) -> list[str]:
+    """Find media files in a directory, recursively."""
+    return sorted(
+        os.path.join(root, name)
+        for root, _, files in os.walk(dir)
+        for name in files
+        if name.lower().endswith(MEDIA_EXTENSIONS)
+    )
@@ -0,0 +1,58 @@
+import time
+
+
+class StalledError(Exception):
+    """Raised inside a transfer to abort it once it stalls or overruns its deadline."""
+
+
+class Watchdog:
+    """
+    Tracks the progress of a transfer and aborts it once it stalls or overruns its deadline.
+
+    The checks run in the downloading thread: from the progress hook, and from the retry sleep
+    of yt-dlp, which a hung read reaches once the socket timeout fires.
+
+    Parameters:
+        stall_timeout: Seconds without new bytes before the transfer is aborted.
+        min_rate: Minimum expected rate in bytes per second. Each file is aborted once it takes
+            longer than its size at this rate, plus `stall_timeout` of grace.
+    """
+
+    def __init__(self, stall_timeout: float | None = None, min_rate: int | None = None):
+        self.stall_timeout = stall_timeout
+        self.min_rate = min_rate
+        self.filename: str | None = None
+        self.downloaded = 0
+        self.started = self.progressed = time.monotonic()
+        self.deadline: float | None = None
+
+    def update(self, d: dict) -> None:
+        """
+        Record a progress report of yt-dlp, aborting the transfer if it is overdue.
+
+        Parameters:
+            d: Progress hook report.
+        """
+        now = time.monotonic()
+        # Every stream of a merged format is a file of its own, with its own byte count
+        if d.get("filename") != self.filename:
+            self.filename = d.get("filename")
+            self.downloaded = 0
+            self.started = self.progressed = now
+            self.deadline = None
+        if d.get("downloaded_bytes", 0) > self.downloaded:
+            self.downloaded = d["downloaded_bytes"]
+            self.progressed = now
+        total = d.get("total_bytes") or d.get("total_bytes_estimate")
+        if self.min_rate and total:
+            self.deadline = self.started + (self.stall_timeout or 0) + total / self.min_rate
+        if d["status"] == "downloading":
+            self.check()
+
+    def check(self) -> None:
+        """Raise `StalledError` if the transfer stalled or overran its deadline."""
+        now = time.monotonic()
+        if self.stall_timeout and now - self.progressed > self.stall_timeout:
+            raise StalledError(f"No progress for {self.stall_timeout:g}s")
+        if self.deadline is not None and now > self.deadline:
+            raise StalledError(f"Slower than the minimum rate of {self.min_rate} B/s")
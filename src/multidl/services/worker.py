@@ -0,0 +1,106 @@
+import os
+import socket
+import sqlite3
+import time
+from ..jobs import JobQueue, JobSchema
+from ..term import Print, ProgressBar
+from ..utils import Quality
+from .helpers import Downloader, DownloadOptions, DownloadTaskSchema
+from rich.progress import TaskID
+from threading import Event, Lock, Thread
+
+
+class Worker:
+    """
+    Worker that claims jobs from a shared job queue and downloads them.
+
+    Parameters:
+        queue: Path to the shared job queue.
+        threads: Number of jobs to run at once.
+        follow: Keep polling for new jobs instead of exiting once the queue is drained.
+        poll: Seconds to wait between polls when no job is claimable.
+    """
+
+    def __init__(self, queue: str, threads: int = 5, follow: bool = False, poll: float = 5):
+        self.queue = JobQueue(queue)
+        self.threads = max(threads, 1)
+        self.follow = follow
+        self.poll = poll
+        self.name = f"{socket.gethostname()}-{os.getpid()}"
+        # A worker may run for days, finished rows are folded into a summary
+        self.progress = ProgressBar(windowed=True)
+        self.downloaders: dict[str | None, Downloader] = {}
+        self.lock = Lock()
+
+    def _downloader(self, quality: str | None) -> Downloader:
+        """Get the downloader of a quality, jobs without one use the config default."""
+        with self.lock:
+            if quality not in self.downloaders:
+                options = DownloadOptions.from_config(
+                    quality=Quality.from_key(quality) if quality is not None else None
+                )
+                self.downloaders[quality] = Downloader(
+                    tasks=[], progress=self.progress, options=options
+                )
+            return self.downloaders[quality]
+
+    def _heartbeat(self, job: JobSchema, worker: str, stop: Event):
+        """Keep the lease of a job alive until the job is finished."""
+        while not stop.wait(self.queue.lease / 3):
+            if not self.queue.heartbeat(job["id"], worker):
+                return
+
+    def _run_job(self, job: JobSchema, worker: str):
+        stop = Event()
+        Thread(target=self._heartbeat, args=(job, worker, stop), daemon=True).start()
+        try:
+            filepath = self._downloader(job["task"].get("quality")).run_task(
+                DownloadTaskSchema.from_dict(job["task"])
+            )
+        except (Exception, SystemExit) as e:
+            self.queue.fail(job["id"], worker, str(e) or type(e).__name__)
+            return
+        finally:
+            stop.set()
+        if filepath:
+            self.queue.complete(job["id"], worker, f"{socket.gethostname()}:{filepath}")
+        else:
+            self.queue.fail(job["id"], worker, "Nothing was downloaded")
+
+    def _loop(self, slot: int, task: TaskID):
+        worker = f"{self.name}-{slot}"
+        while True:
+            try:
+                job = self.queue.claim(worker)
+                drained = job is None and not self.follow and self.queue.stats()["leased"] == 0
+            except sqlite3.OperationalError as e:
+                # The queue may sit on a shared disk that is busy or briefly unreachable
+                Print.warn(f"Job queue unavailable ({e}), retrying in {self.poll:g}s.")
+                time.sleep(self.poll)
+                continue
+            if job is None:
+                if drained:
+                    return
+                time.sleep(self.poll)
+                continue
+            self._run_job(job, worker)
+            self.progress.playlist.update(task, advance=1)
+
+    def run(self) -> None:
+        """Work through the queue until it is drained."""
+        with self.progress.live:
+            task = self.progress.playlist.add_task(
+                f"[yellow]Working on[/] [cyan]{self.queue.path}[/]", total=None
+            )
+            threads = [Thread(target=self._loop, args=(slot, task)) for slot in range(self.threads)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.progress.playlist.update(
+                task, description=f"[green]Worked on[/] [cyan]{self.queue.path}[/]"
+            )
+        stats = self.queue.stats()
+        Print.success(
+            f"Queue drained: [cyan]{stats['done']}[/] done, [cyan]{stats['failed']}[/] failed."
+        )
@@ -1,9 +1,12 @@
 import datetime
 from ..term import InfoTable, ProgressBar, SearchTable
 from ..utils import SuppressLogger
-from .helpers import Downloader, DownloadTaskSchema
+from .helpers import Downloader, DownloadOptions, DownloadTaskSchema, drain
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import TYPE_CHECKING, Literal, cast
 from yt_dlp import YoutubeDL
+from yt_dlp.utils import YoutubeDLError
 
 if TYPE_CHECKING:
     from yt_dlp import _Params
@@ -21,54 +24,63 @@ class Search:
     """
     Search videos from YouTube.
 
+    Results are streamed into the search table as they arrive, and full info for the top results
+    is prefetched in the background while the user picks one.
+
     Parameters:
         query: Query string to search for.
-        progress: A progress bar to use for downloading.
+        prefetch: Number of top results to prefetch full info for.
     """
 
-    def __init__(
-        self,
-        query: str,
-        progress: ProgressBar,
-    ):
-        self.url: str | None = None
-
-        with progress.live:
-            task = progress.search.add_task("[yellow]Searching[/]", total=1)
-            self.vids: list[dict[str, str]] = []
-
-            with YoutubeDL(
-                {
-                    "quiet": True,
-                    "noprogress": True,
-                    "ignoreerrors": True,
-                    "no_warnings": True,
-                    "logger": SuppressLogger(),
-                    "logtostderr": False,
-                    "format": "bv*+ba/best",
-                    "extract_flat": True,
-                    "noplaylist": True,
-                }
-            ) as ydl:
-                info = ydl.extract_info(f"ytsearch20:{query}", download=False)
-                if info and "entries" in info:  # Check if info is not None and has entries
-                    for i in cast(list, info["entries"]):
-                        self.vids.append({"title": i["title"], "url": i["url"]})
-                else:  # Throw an error if no entries are found and exit
-                    progress.search.update(
-                        task, description="[red][bold]✗[/] No Results Found[/]", completed=1
-                    )
-                    exit(1)
-                progress.search.update(
-                    task, description="[green]Fetched Search Info[/]", completed=1
-                )
-                progress.search.remove_task(task)
-        self.video_url = self.vids[int(SearchTable(self.vids).get())]["url"]
+    def __init__(self, query: str, prefetch: int = 5):
+        self.prefetch = prefetch
+        self.pool = ThreadPoolExecutor(max_workers=prefetch)
+        self.futures: dict[str, Future] = {}
+        self.ydl_opts: "_Params" = {  # noqa: UP037
+            "quiet": True,
+            "noprogress": True,
+            "ignoreerrors": True,
+            "no_warnings": True,
+            "logger": SuppressLogger(),
+            "logtostderr": False,
+            "noplaylist": True,
+        }
+
+        table = SearchTable(self._results(query))
+        self.vids = table.data
+        self.video_url = self.vids[table.get()]["url"]
+
+    def _resolve(self, url: str) -> dict | None:
+        """Extract full info for a video without processing formats."""
+        with YoutubeDL(self.ydl_opts) as ydl:
+            info = ydl.extract_info(url, download=False, process=False)
+        return dict(info) if info else None
+
+    def _results(self, query: str) -> Iterator[dict[str, str]]:
+        """Yield search results lazily, prefetching the top ones as they arrive."""
+        with YoutubeDL(self.ydl_opts | {"extract_flat": True}) as ydl:
+            try:
+                info = ydl.extract_info(f"ytsearch20:{query}", download=False, process=False)
+                # Entries are lazy, so extraction errors surface while iterating
+                for i in cast(Iterable, (info or {}).get("entries") or []):
+                    if len(self.futures) < self.prefetch:
+                        self.futures[i["url"]] = self.pool.submit(self._resolve, i["url"])
+                    yield {"title": i["title"], "url": i["url"]}
+            except YoutubeDLError:
+                return
 
     def get(self) -> str:
         """Get the selected video URL."""
         return self.video_url
 
+    def info(self) -> dict | None:
+        """Get the prefetched info of the selected video, if it was prefetched."""
+        future = self.futures.pop(self.video_url, None)
+        for other in self.futures.values():
+            other.cancel()
+        self.pool.shutdown(wait=False)
+        return future.result() if future else None
+
 
 class YouTube:
     """
@@ -134,9 +146,14 @@ class YouTube:
         ]
         InfoTable("Playlist", pl_data).print()
 
-    def info_video(self) -> None:
-        """Get the video info."""
-        video = self._fetch_info(True)
+    def info_video(self, info: dict | None = None) -> None:
+        """
+        Get the video info.
+
+        Parameters:
+            info: Already extracted video info. Fetched if not given.
+        """
+        video = info or self._fetch_info(True)
         video_data: list[tuple[str, str]] = [
             ("Title", str(video["title"])),
             ("Length", str(datetime.timedelta(seconds=video["duration"]))),
@@ -187,14 +204,16 @@ class YouTube:
 
     def info_search(self) -> None:
         """Get search info."""
-        self.query = Search(self.query, self.progress).get()
-        self.info_video()
+        search = Search(self.query)
+        self.query = search.get()
+        self.info_video(search.info())
 
     def download_pl(
         self,
         type: Literal["audio", "video", "default"] = "default",
         subtitles: list[str] | None = None,
         threads: int | Literal["max"] = 5,
+        options: DownloadOptions | None = None,
     ) -> None:
         """
         Download the playlist.
@@ -203,47 +222,118 @@ class YouTube:
             type: The type of media to download.
         """
         pl = self._fetch_info("in_playlist")
+        total = len(pl["entries"])
         with self.progress.live:
             task = self.progress.playlist.add_task(
                 f"[yellow]Downloading Playlist[/] [cyan]{pl['title']}[/]",
-                total=len(pl["entries"]),
+                total=total,
+            )
+            # Entries are dropped as their tasks are built
+            tasks = (
+                self._entry_task(i, pl["title"], pl["title"], type, subtitles)
+                for i in drain(pl["entries"])
             )
-            tasks = [
-                DownloadTaskSchema(
-                    query=i["url"],
-                    title=i["title"],
-                    type=type,
-                    album=pl["title"],
-                    playlist=pl["title"],
-                    subtitles=subtitles,
-                )
-                for i in pl["entries"]
-            ]
             Downloader(
                 tasks=tasks,
                 progress=self.progress,
                 playlist_task=task,
                 threads=threads,
+                options=options,
             ).download()
             self.progress.playlist.update(
                 task,
                 description=f"[green]Downloaded Playlist[/] [cyan]{pl['title']}[/]",
-                completed=len(pl["entries"]),
+                completed=total,
             )
 
+    @staticmethod
+    def _entry_task(
+        entry: dict, album: str, playlist: str, type: str, subtitles: list[str] | None
+    ) -> DownloadTaskSchema:
+        """Build the task of a flat playlist entry."""
+        return DownloadTaskSchema(
+            query=entry["url"],
+            title=entry["title"],
+            type=type,
+            album=album,
+            playlist=playlist,
+            subtitles=subtitles,
+            duration=entry.get("duration"),
+            filesize=entry.get("filesize_approx"),
+            id=entry.get("id"),
+        )
+
+    def pl_marker(self) -> dict | None:
+        """
+        Get a change marker of the playlist, read from its first page only.
+
+        Returns:
+            The last modified date and the item count, or None if they can't be trusted. YouTube
+            only reports the day of the last change, so a playlist changed within the last day
+            has no marker.
+        """
+        ydl_opts: "_Params" = {  # noqa: UP037
+            "quiet": True,
+            "noprogress": True,
+            "ignoreerrors": True,
+            "no_warnings": True,
+            "logger": SuppressLogger(),
+            "logtostderr": False,
+            "extract_flat": "in_playlist",
+        }
+        try:
+            with YoutubeDL(ydl_opts) as ydl:
+                # Entries stay lazy, so only the first page is fetched
+                pl = ydl.extract_info(self.query, download=False, process=False)
+        except YoutubeDLError:
+            return None
+        modified = pl.get("modified_date") if pl else None
+        if not modified:
+            return None
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        if modified >= yesterday.strftime("%Y%m%d"):
+            return None
+        return {"modified_date": modified, "count": pl.get("playlist_count")}
+
+    def pl_entries(
+        self,
+        playlist: str,
+        type: Literal["audio", "video", "default"] = "default",
+        subtitles: list[str] | None = None,
+    ) -> tuple[str, dict[str, DownloadTaskSchema]]:
+        """
+        Enumerate the playlist.
+
+        Parameters:
+            playlist: Folder to download the entries into.
+            type: The type of media to download.
+
+        Returns:
+            The playlist title, and the task of each entry keyed by video ID.
+        """
+        pl = self._fetch_info("in_playlist")
+        return pl["title"], {
+            i["id"]: self._entry_task(i, pl["title"], playlist, type, subtitles)
+            for i in drain(pl["entries"])
+            if i.get("id")
+        }
+
     def download_video(
         self,
         type: Literal["audio", "video", "default"] = "default",
         subtitles: list[str] | None = None,
         threads: int | Literal["max"] = 5,
+        options: DownloadOptions | None = None,
+        info: dict | None = None,
     ) -> None:
         """
         Download the video.
 
         Parameters:
             type: The type of media to download.
+            info: Already extracted video info, handed to the downloader as is.
         """
-        vid = self._fetch_info(True)
+        vid = info or self._fetch_info(True)
         with self.progress.live:
             tasks = [
                 DownloadTaskSchema(
@@ -251,12 +341,16 @@ class YouTube:
                     title=vid["title"],
                     type=type,
                     subtitles=subtitles,
+                    duration=vid.get("duration"),
+                    info=info,
+                    id=vid.get("id"),
                 )
             ]
             Downloader(
                 tasks=tasks,
                 progress=self.progress,
                 threads=threads,
+                options=options,
             ).download()
 
     def download_channel(
@@ -264,6 +358,7 @@ class YouTube:
         type: Literal["audio", "video", "default"] = "default",
         subtitles: list[str] | None = None,
         threads: int | Literal["max"] = 5,
+        options: DownloadOptions | None = None,
     ) -> None:
         """
         Download the channel.
@@ -272,52 +367,62 @@ class YouTube:
             type: The type of media to download.
         """
         channel = self._fetch_info(True)
+        total = count_channel_entries(channel)
         with self.progress.live:
             task = self.progress.playlist.add_task(
                 f"[yellow]Downloading Channel[/] [cyan]{channel['channel']}[/]",
-                total=count_channel_entries(channel),
+                total=total,
             )
-            tasks = []
-            for i in channel["entries"]:
-                if i["entries"]:
-                    for j in i["entries"]:
-                        tasks.append(
-                            DownloadTaskSchema(
-                                query=j["url"],
-                                title=j["title"],
-                                type=type,
-                                album=channel["channel"],
-                                playlist=f"{channel['channel']}%dir%{i['title']}",
-                                subtitles=subtitles,
-                            )
-                        )
-                else:
-                    tasks.append(
-                        DownloadTaskSchema(
-                            query=i["url"],
-                            title=i["title"],
-                            type=type,
-                            album=channel["channel"],
-                            playlist=channel["channel"],
-                        )
-                    )
             Downloader(
-                tasks=tasks,
+                tasks=self._channel_tasks(channel, type, subtitles),
                 progress=self.progress,
                 playlist_task=task,
                 threads=threads,
+                options=options,
             ).download()
             self.progress.playlist.update(
                 task,
                 description=f"[green]Downloaded Channel[/] [cyan]{channel['channel']}[/]",
-                completed=count_channel_entries(channel),
+                completed=total,
             )
 
+    @staticmethod
+    def _channel_tasks(
+        channel: dict, type: str, subtitles: list[str] | None
+    ) -> Iterator[DownloadTaskSchema]:
+        """Yield the tasks of a channel, dropping its entries as their tasks are built."""
+        for i in drain(channel["entries"]):
+            if i["entries"]:
+                for j in drain(i["entries"]):
+                    yield DownloadTaskSchema(
+                        query=j["url"],
+                        title=j["title"],
+                        type=type,
+                        album=channel["channel"],
+                        playlist=f"{channel['channel']}%dir%{i['title']}",
+                        subtitles=subtitles,
+                        duration=j.get("duration"),
+                        filesize=j.get("filesize_approx"),
+                        id=j.get("id"),
+                    )
+            else:
+                yield DownloadTaskSchema(
+                    query=i["url"],
+                    title=i["title"],
+                    type=type,
+                    album=channel["channel"],
+                    playlist=channel["channel"],
+                    duration=i.get("duration"),
+                    filesize=i.get("filesize_approx"),
+                    id=i.get("id"),
+                )
+
     def download_search(
         self,
         type: Literal["audio", "video", "default"] = "default",
         subtitles: list[str] | None = None,
         threads: int | Literal["max"] = 5,
+        options: DownloadOptions | None = None,
     ) -> None:
         """
         Download the search result.
@@ -325,5 +430,6 @@ class YouTube:
         Parameters:
             type: The type of media to download.
         """
-        self.query = Search(self.query, self.progress).get()
-        self.download_video(type, subtitles, threads)
+        search = Search(self.query)
+        self.query = search.get()
+        self.download_video(type, subtitles, threads, options, search.info())
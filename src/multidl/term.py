@@ -1,5 +1,8 @@
+import rich
 from .config import DEFAULT_CONFIG_PATH, MULTIDL_CONFIG, Config
-from dataclasses import dataclass
+from collections import deque
+from collections.abc import Iterable
+from dataclasses import dataclass, field
 from importlib.metadata import metadata
 from pyfiglet import Figlet
 from rich import box
@@ -14,6 +17,8 @@ from rich.progress import (
     MofNCompleteColumn,
     Progress,
     SpinnerColumn,
+    Task,
+    TaskID,
     TextColumn,
     TimeElapsedColumn,
     TimeRemainingColumn,
@@ -22,10 +27,19 @@ from rich.progress import (
 from rich.prompt import Confirm, Prompt
 from rich.syntax import Syntax
 from rich.table import Table
+from threading import Lock
+from typing import cast
 
 console = Console()
 
 
+def use_stderr() -> None:
+    """Send all console output to stderr, keeping stdout free for streamed media."""
+    console.stderr = True
+    # The progress bars render on rich's global console
+    rich.reconfigure(stderr=True)
+
+
 class InfoTable(Table):
     """
     Generate rich info table.
@@ -55,30 +69,36 @@ class InfoTable(Table):
 
 class SearchTable(Table):
     """
-    Generate rich search table.
+    Generate rich search table. Rows are rendered as soon as they arrive.
 
     Parameters:
-        data: List of video dictionaries containing 'url' and 'title'.
+        data: Iterable of video dictionaries containing 'url' and 'title'.
     """
 
-    def __init__(self, data: list[dict[str, str]]):
+    def __init__(self, data: Iterable[dict[str, str]]):
         super().__init__(box=None, show_header=False)
         self.option: int = 1
-        for idx, i in enumerate(data, start=1):
-            self.add_row(f"[white][[cyan]{idx}[/]][/]", f"[green]{i['title']}[/]")
+        self.data: list[dict[str, str]] = []
         panel = Panel.fit(
             self,
-            title=f"[bold green]Top {len(data)} Search Results[/]",
+            title="[bold yellow]Searching[/]",
             title_align="left",
             style="green",
             padding=1,
             box=box.ROUNDED,
         )
-        console.print(panel)
+        with Live(panel, console=console, refresh_per_second=10):
+            for idx, i in enumerate(data, start=1):
+                self.data.append(i)
+                self.add_row(f"[white][[cyan]{idx}[/]][/]", f"[green]{i['title']}[/]")
+            panel.title = f"[bold green]Top {len(self.data)} Search Results[/]"
+        if not self.data:
+            Print.error("No Results Found")
+            exit(1)
         self.option = int(
             Print.input(
-                f"Enter the option number [[cyan]1-{len(data)}[/]]",
-                choices=[str(i) for i in range(1, len(data) + 1)],
+                f"Enter the option number [[cyan]1-{len(self.data)}[/]]",
+                choices=[str(i) for i in range(1, len(self.data) + 1)],
             )
         )
 
@@ -170,6 +190,22 @@ class ConfigPanel:
                     ),
                     (0, 0, 0, 2),
                 ),
+                "[bold yellow]How to tune performance?[/]",
+                Padding(
+                    "\n".join(
+                        [
+                            "[white]Set defaults for each host in the [cyan]\\[performance][/] section of the config file.[/]",
+                            "[white][cyan]threads[/]: Downloads to run at once. [cyan]rate-limit[/]: Bytes per second for each download, [cyan]0[/] for no limit.[/]",
+                            "[white][cyan]cache-dir[/]: Cache directory of yt-dlp, shared by every download. [cyan]temp-dir[/]: Scratch directory for intermediate files.[/]",
+                            "[white][cyan]postprocess-threads[/]: Files to verify at once. [cyan]spotify-requests[/]: Concurrent Spotify API requests.[/]",
+                            "[white][cyan]stall-timeout[/]: Seconds without progress before a download is requeued. [cyan]min-rate[/]: Bytes per second below which a download is requeued. [cyan]requeues[/]: Times a stalled download is requeued.[/]",
+                            "[white][cyan]quality[/]: [cyan]fast[/] for progressive single files without merging, [cyan]balanced[/] for up to 1080p remuxed without transcoding, or [cyan]best[/].[/]",
+                            "[white][cyan]subtitle-requests[/]: Subtitle tracks fetched at once. [cyan]translated-subtitles[/]: Download subtitles machine-translated from another language.[/]",
+                            "[white][cyan]lookahead[/]: Upcoming downloads resolved while the current ones transfer, [cyan]0[/] to disable.[/]",
+                        ]
+                    ),
+                    (0, 0, 0, 2),
+                ),
             ),
             title="[bold yellow]Config Docs[/]",
             style="yellow",
@@ -180,9 +216,19 @@ class ConfigPanel:
         console.print(panel)
 
 
+# Active download rows rendered at once, the others are counted in the summary row
+ACTIVE_ROWS = 10
+
+
 @dataclass
 class ProgressBar:
-    """Multiple progress bars for multidl."""
+    """
+    Multiple progress bars for multidl.
+
+    Once `windowed`, finished download rows are folded into a single summary row of done and
+    failed files, bytes and rate, and at most `rows` active downloads are rendered. Rendering
+    costs the same for a channel of thousands of videos as for a single video.
+    """
 
     download = Progress(
         SpinnerColumn(style="yellow", finished_text="[green bold]✓[/]"),
@@ -205,12 +251,104 @@ class ProgressBar:
         MofNCompleteColumn(),
         TextColumn("•"),
         TimeElapsedColumn(),
+        TextColumn("•"),
+        TimeRemainingColumn(compact=True),
     )
     search = Progress(
         SpinnerColumn(style="yellow", finished_text="[green bold]✓[/]"),
         TextColumn("[progress.description]{task.description}"),
     )
     live = Live(Group(download, playlist, search))
+    windowed: bool = False
+    rows: int = ACTIVE_ROWS
+    finished: int = 0
+    failed: int = 0
+    finished_bytes: float = 0
+    finished_task: TaskID | None = None
+    shown: int = 0
+    hidden: deque[TaskID] = field(default_factory=deque)
+    lock: Lock = field(default_factory=Lock)
+
+    def add(self, description: str) -> TaskID:
+        """
+        Add a download row, hidden while `rows` active rows are shown.
+
+        Parameters:
+            description: Description of the download.
+        """
+        with self.lock:
+            if not self.windowed:
+                return self.download.add_task(description, total=0, start=False)
+            if self.finished_task is None:
+                self.finished_task = self.download.add_task("", total=0)
+                self._summarize()
+            visible = self.shown < self.rows
+            task = self.download.add_task(description, total=0, start=False, visible=visible)
+            if visible:
+                self.shown += 1
+            else:
+                self.hidden.append(task)
+                self._summarize()
+            return task
+
+    def retire(self, task: TaskID | None, failed: bool = False) -> None:
+        """
+        Fold a finished download row into the summary row, so rows don't pile up.
+
+        Parameters:
+            task: ID of the finished download row, None for a failure whose row is gone.
+            failed: Whether the download failed.
+        """
+        with self.lock:
+            row = self._remove(task) if task is not None else None
+            if failed:
+                self.failed += 1
+            else:
+                self.finished += 1
+                self.finished_bytes += row.completed if row is not None else 0
+            if self.finished_task is None:
+                self.finished_task = self.download.add_task("", total=0)
+            self._summarize()
+
+    def drop(self, task: TaskID) -> None:
+        """
+        Remove a download row without counting it, e.g. when the download is retried.
+
+        Parameters:
+            task: ID of the download row.
+        """
+        with self.lock:
+            self._remove(task)
+            if self.finished_task is not None:
+                self._summarize()
+
+    def _remove(self, task: TaskID) -> Task | None:
+        """Remove a download row, showing the oldest hidden row in its place."""
+        row = next((t for t in self.download.tasks if t.id == task), None)
+        if row is None:
+            return None
+        self.download.remove_task(task)
+        if not row.visible:
+            self.hidden.remove(task)
+        elif self.hidden:
+            self.download.update(self.hidden.popleft(), visible=True)
+        else:
+            self.shown = max(self.shown - 1, 0)
+        return row
+
+    def _summarize(self) -> None:
+        """Update the summary row."""
+        description = f"[green]Finished[/] [cyan]{self.finished}[/] file(s)"
+        if self.failed:
+            description += f" • [red]Failed[/] [cyan]{self.failed}[/]"
+        if self.hidden:
+            description += f" • [yellow]{len(self.hidden)}[/] more downloading"
+        self.download.update(
+            cast(TaskID, self.finished_task),
+            description=description,
+            total=self.finished_bytes,
+            completed=self.finished_bytes,
+        )
 
 
 class MultiDLArt:
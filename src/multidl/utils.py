@@ -1,3 +1,8 @@
+import os
+import shutil
+import sys
+from collections.abc import Callable
+from dataclasses import dataclass
 from typing import TYPE_CHECKING, Literal
 
 if TYPE_CHECKING:
@@ -45,6 +50,210 @@ def sanitize_path(path: str) -> str:
     return path
 
 
+def link_file(src: str, dst: str) -> None:
+    """
+    Materialise a file at a new path without downloading it again.
+
+    Tries a hardlink first, then a reflink (Linux copy-on-write filesystems), then a plain copy.
+
+    Parameters:
+        src: Path of the existing file.
+        dst: Path to materialise the file at.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+    try:
+        os.link(src, dst)
+        return
+    except OSError:
+        pass
+    try:
+        import fcntl
+
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            fcntl.ioctl(d.fileno(), 0x40049409, s.fileno())  # FICLONE
+        return
+    except (ImportError, OSError):
+        pass
+    shutil.copy2(src, dst)
+
+
+def move_file(src: str, dst: str) -> None:
+    """
+    Move a file so that it appears at its destination with a single atomic rename.
+
+    Across filesystems the file is first copied next to the destination.
+
+    Parameters:
+        src: Path of the file to move.
+        dst: Destination path.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+    try:
+        os.replace(src, dst)
+        return
+    except OSError:
+        pass
+    tmp = f"{dst}.multidl-part"
+    shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+    os.remove(src)
+
+
+def peak_rss() -> int | None:
+    """Get the peak resident set size of the process in bytes, if the platform reports it."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in KiB elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+QUALITY_PROFILES = ("fast", "balanced", "best")
+# Height cap of each quality profile, unless a max height is given
+PROFILE_HEIGHTS = {"fast": 480, "balanced": 1080, "best": None}
+# Rough bytes per second of each quality profile, used for size estimates
+PROFILE_BYTERATES = {
+    "fast": {"audio": 16_000, "video": 90_000, "default": 100_000},
+    "balanced": {"audio": 16_000, "video": 250_000, "default": 270_000},
+    "best": {"audio": 20_000, "video": 600_000, "default": 620_000},
+}
+
+
+@dataclass(frozen=True)
+class Quality:
+    """
+    Speed-vs-quality format selection.
+
+    Parameters:
+        profile: 'best' chases the highest quality, merging separate streams and converting to
+            mp4 or vorbis. 'balanced' caps video at 1080p and prefers mp4 and m4a streams, which
+            are merged and remuxed without transcoding. 'fast' prefers progressive single-file
+            formats capped at 480p, so nothing is merged, and keeps the audio codec as is.
+        max_height: Highest video height, replacing the cap of the profile.
+        codec: Codec prefix the video, or the audio of audio downloads, should have, e.g. 'avc1',
+            'vp9', 'av01', 'mp4a' or 'opus'.
+        max_filesize: Largest file size in bytes. Formats of unknown size are allowed.
+
+    Caps are soft: when no format meets them, the best available format is downloaded instead.
+    """
+
+    profile: str = "best"
+    max_height: int | None = None
+    codec: str | None = None
+    max_filesize: int | None = None
+
+    @property
+    def key(self) -> str:
+        """Short form of the quality for archive keys, empty for the default."""
+        parts = [] if self.profile == "best" else [self.profile]
+        if self.max_height:
+            parts.append(f"{self.max_height}p")
+        if self.codec:
+            parts.append(self.codec)
+        if self.max_filesize:
+            parts.append(f"{self.max_filesize}B")
+        return ",".join(parts)
+
+    @property
+    def cover(self) -> bool:
+        """Whether the thumbnail is embedded as cover art. 'fast' skips it to avoid a remux."""
+        return self.profile != "fast"
+
+    @classmethod
+    def from_key(cls, key: str) -> "Quality":
+        """
+        Parse the short form of a quality.
+
+        Parameters:
+            key: Short form made by `key`.
+        """
+        options: dict = {}
+        for part in filter(None, key.split(",")):
+            if part in QUALITY_PROFILES:
+                options["profile"] = part
+            elif part[:-1].isdigit() and part[-1] == "p":
+                options["max_height"] = int(part[:-1])
+            elif part[:-1].isdigit() and part[-1] == "B":
+                options["max_filesize"] = int(part[:-1])
+            else:
+                options["codec"] = part
+        return cls(**options)
+
+    def _filters(self, stream: Literal["video", "audio"], soft: bool = True) -> str:
+        """
+        Format filters of the caps, for video or audio formats.
+
+        Parameters:
+            stream: Kind of formats the filters are for.
+            soft: Include the height cap of the profile. Only caps that were given are hard.
+        """
+        filters = ""
+        height = self.max_height or (PROFILE_HEIGHTS[self.profile] if soft else None)
+        if height and stream == "video":
+            filters += f"[height<=?{height}]"
+        if self.codec:
+            filters += f"[{'v' if stream == 'video' else 'a'}codec^={self.codec}]"
+        if self.max_filesize:
+            filters += f"[filesize<?{self.max_filesize}][filesize_approx<?{self.max_filesize}]"
+        return filters
+
+    def format(self, type: str = "default") -> str:
+        """
+        Get the yt-dlp format selector.
+
+        Parameters:
+            type: The type of media to download.
+        """
+        v = self._filters("video")
+        a = self._filters("audio")
+        # Falls back to the smallest format over the height cap of the profile when none is under it
+        hard = self._filters("video", soft=False)
+        fallback = None if v == hard else hard
+        if type == "audio":
+            # Caps that were given fall back to the best format when none meets them
+            return f"ba[ext=m4a]{a}/ba{a}" + ("/ba" if a else "")
+        if type == "video":
+            selector = f"bv[ext=mp4]{v}/bv{v}" + (f"/wv{fallback}" if fallback is not None else "")
+            return selector + ("/bv" if hard else "")
+        if self.profile == "fast":
+            # Progressive formats hold both streams, so nothing is merged
+            selector = f"b[ext=mp4]{v}/b{v}/bv*{v}+ba"
+        elif self.profile == "balanced":
+            # mp4 video and m4a audio merge into mp4 as they are
+            selector = f"bv*[ext=mp4]{v}+ba[ext=m4a]/b[ext=mp4]{v}/bv*{v}+ba/b{v}"
+        else:
+            selector = f"bv*{v}+ba[ext=mp4]/best{v}"
+        if fallback is not None:
+            selector += f"/w{fallback}/wv*{fallback}+ba"
+        return selector + ("/bv*+ba/best" if hard else "")
+
+    def postprocessing(self, type: str = "default") -> list[str]:
+        """
+        Describe the work done after downloading, for plans.
+
+        Parameters:
+            type: The type of media to download.
+        """
+        steps = []
+        if type == "default" and self.profile != "fast":
+            steps.append("merge")
+        if self.profile == "best":
+            steps.append("transcode to vorbis" if type == "audio" else "convert to mp4")
+        else:
+            steps.append("copy audio" if type == "audio" else "remux to mp4")
+        if self.profile != "fast":
+            steps.append("embed thumbnail")
+        steps.append("tag")
+        return steps
+
+    def byterate(self, type: str = "default") -> int:
+        """Rough bytes per second of a download of this quality."""
+        rates = PROFILE_BYTERATES[self.profile]
+        return rates.get(type, rates["default"])
+
+
 class YTOptions:
     """
     Get the options for yt-dlp.
@@ -55,6 +264,18 @@ class YTOptions:
         dir: The directory to save the file.
         filename: The filename to save the file as.
         progress_hooks: A list of progress hooks to use.
+        post_hooks: A list of hooks called with the final file path after postprocessing.
+        segments: Number of fragments of a DASH/HLS format to download concurrently.
+        temp_dir: Scratch directory for all intermediate files. Replaces `dir` when set, the caller
+            moves the final file into place.
+        rate_limit: Maximum download rate in bytes per second.
+        cache_dir: Cache directory of yt-dlp.
+        retry_sleep: Called with the attempt number before each retry of a download or fragment.
+            Enables retrying dropped connections.
+        socket_timeout: Seconds a connection may stay silent before it is retried.
+        quality: Speed-vs-quality format selection.
+        stream: Write the media to stdout as it arrives, without postprocessing. Formats that
+            need merging are muxed on the fly by ffmpeg.
     """
 
     def __init__(
@@ -64,35 +285,48 @@ class YTOptions:
         dir: str = ".",
         filename: str = "%(title)s",
         progress_hooks: list | None = None,
+        post_hooks: list | None = None,
+        segments: int = 1,
+        temp_dir: str | None = None,
+        rate_limit: int | None = None,
+        cache_dir: str | None = None,
+        retry_sleep: Callable[[int], float | None] | None = None,
+        socket_timeout: float | None = None,
+        quality: Quality | None = None,
+        stream: bool = False,
     ):
         self.yt_opts: dict = {}
 
-        safe_dir = sanitize_path(dir)
+        safe_dir = temp_dir or dir
         safe_filename = sanitize_path(filename)
         postprocessors: list = []
 
         if subtitles and type != "audio":  # Embed subtitles only for video or default type
             postprocessors.append({"key": "FFmpegEmbedSubtitle"})
 
+        quality = quality or Quality()
+        format_str = quality.format(type)
         if type == "audio":  # Download audio only
-            format_str = "ba[ext=m4a]/ba"
             postprocessors.append(
                 {"key": "FFmpegExtractAudio", "preferredcodec": "vorbis", "preferredquality": "0"}
+                if quality.profile == "best"
+                # Keeps the downloaded codec, so the audio is copied instead of transcoded
+                else {"key": "FFmpegExtractAudio", "preferredcodec": "best"}
             )
-        else:
-            if type == "video":  # Download video only
-                format_str = "bv[ext=mp4]/bv"
-            else:
-                format_str = "bv*+ba[ext=mp4]/best"
+        elif quality.profile == "best":
             postprocessors.append({"key": "FFmpegVideoConvertor", "preferedformat": "mp4"})
+        else:
+            postprocessors.append({"key": "FFmpegVideoRemuxer", "preferedformat": "mp4"})
 
         # Embed thumbnail and metadata in both audio and video
-        postprocessors.extend(
-            [
-                {"key": "EmbedThumbnail"},
-                {"key": "FFmpegMetadata"},
-            ]
-        )
+        thumbnail = quality.cover
+        if thumbnail:
+            postprocessors.append({"key": "EmbedThumbnail"})
+        postprocessors.append({"key": "FFmpegMetadata"})
+
+        if stream:
+            # Nothing is written to disk, so there is no file to convert, embed into or tag
+            postprocessors, thumbnail, subtitles = [], False, None
 
         yt_options: "_Params" = {  # noqa: UP037
             "quiet": True,
@@ -102,10 +336,13 @@ class YTOptions:
             "logger": SuppressLogger(),
             "logtostderr": False,
             "format": format_str,
-            "outtmpl": f"{safe_dir}/{safe_filename}.%(ext)s",
+            "outtmpl": "-" if stream else f"{safe_dir}/{safe_filename}.%(ext)s",
+            "writethumbnail": thumbnail,  # Required by EmbedThumbnail
             "postprocessors": postprocessors,
         }
 
+        if type == "default" and quality.profile != "best" and not stream:
+            yt_options["merge_output_format"] = "mp4"
         if subtitles and type != "audio":
             yt_options |= {
                 "writesubtitles": True,
@@ -114,6 +351,24 @@ class YTOptions:
             }
         if progress_hooks:
             yt_options["progress_hooks"] = progress_hooks
+        if post_hooks:
+            yt_options["post_hooks"] = post_hooks
+        if segments > 1:
+            yt_options["concurrent_fragment_downloads"] = segments
+        if rate_limit:
+            yt_options["ratelimit"] = rate_limit
+        if cache_dir:
+            yt_options["cachedir"] = cache_dir
+        # The yt-dlp stubs lack the "http" sleep function and take only whole-second timeouts
+        if retry_sleep:
+            # Dropped connections are retried, the sleep function decides when to give up
+            yt_options |= {  # type: ignore
+                "retries": 10,
+                "fragment_retries": 10,
+                "retry_sleep_functions": {"http": retry_sleep, "fragment": retry_sleep},
+            }
+        if socket_timeout:
+            yt_options["socket_timeout"] = socket_timeout  # type: ignore
         self.yt_options = yt_options
 
     def get(self) -> "_Params":
@@ -0,0 +1,40 @@
+"""Progress hook of the downloader against the reports yt-dlp sends."""
+
+import unittest
+from multidl.services.helpers import YTDownloader
+from multidl.term import ProgressBar
+
+
+class HookTest(unittest.TestCase):
+    def setUp(self):
+        self.progress = ProgressBar()
+        self.downloader = YTDownloader(query="clip", title="clip", progress=self.progress)
+        self.downloader.task = self.progress.add("[yellow]Downloading[/] [cyan]clip[/]")
+        self.addCleanup(self.progress.download.remove_task, self.downloader.task)
+
+    def row(self):
+        return next(t for t in self.progress.download.tasks if t.id == self.downloader.task)
+
+    def test_byte_counts(self):
+        self.downloader.hook({"status": "downloading", "downloaded_bytes": 50, "total_bytes": 200})
+        self.assertEqual((self.row().completed, self.row().total), (50, 200))
+        self.downloader.hook({"status": "finished", "downloaded_bytes": 200, "total_bytes": 200})
+        self.assertEqual((self.row().completed, self.row().total), (200, 200))
+        self.assertIn("Downloaded", self.row().description)
+
+    def test_estimated_total(self):
+        self.downloader.hook(
+            {"status": "downloading", "downloaded_bytes": 50, "total_bytes_estimate": 400}
+        )
+        self.assertEqual((self.row().completed, self.row().total), (50, 400))
+
+    def test_stream_muxed_by_ffmpeg(self):
+        # A merged format streamed to stdout finishes without any byte counts
+        self.downloader.hook({"status": "downloading", "downloaded_bytes": 50, "total_bytes": 200})
+        self.downloader.hook({"filename": "-", "status": "finished", "elapsed": 1.5})
+        self.assertIn("Downloaded", self.row().description)
+        self.assertEqual(self.row().completed, 50)
+
+
+if __name__ == "__main__":
+    unittest.main()
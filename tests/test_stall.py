@@ -0,0 +1,193 @@
+"""
+Stall watchdog against a local HTTP server that stalls mid-stream.
+
+Needs ffmpeg on the PATH for postprocessing. Run with `python -m unittest discover tests`.
+"""
+
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multidl.archive import Archive
+from multidl.services import helpers
+from multidl.services.helpers import Downloader, DownloadOptions, DownloadTaskSchema
+from multidl.services.sinks import LocalSink
+from multidl.utils import Quality
+from threading import Event, Thread
+from typing import cast
+from unittest import mock
+
+# Served media, a short clip with a silent track
+SIZE = 256 * 1024
+STALL_AT = SIZE // 2
+
+
+class StallingHandler(BaseHTTPRequestHandler):
+    """Serves the clip with Range support. Transfers stall halfway until the server is released."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self._serve(body=False)
+
+    def do_GET(self):
+        self._serve(body=True)
+
+    def _serve(self, body: bool):
+        server = cast(StallingServer, self.server)
+        data = server.data
+        match = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", ""))
+        start = int(match.group(1)) if match else 0
+        server.ranges.append((start if match else None, server.release.is_set()))
+        self.send_response(206 if match else 200)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Content-Length", str(len(data) - start))
+        self.send_header("Accept-Ranges", "bytes")
+        if match:
+            self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+        self.end_headers()
+        if not body:
+            return
+        try:
+            if start <= STALL_AT and not server.release.is_set():
+                self._write(data, start, STALL_AT)
+                server.stalled.set()
+                # Holds the connection open without sending anything
+                server.release.wait(60)
+                start = STALL_AT
+            self._write(data, start, len(data))
+        except OSError:
+            pass
+
+    def _write(self, data: bytes, start: int, end: int):
+        for offset in range(start, end, 8192):
+            self.wfile.write(data[offset : min(offset + 8192, end)])
+        self.wfile.flush()
+
+
+class StallingServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, data: bytes):
+        super().__init__(("127.0.0.1", 0), StallingHandler)
+        self.data = data
+        # Range start of each request, None without one, and whether the server was released
+        self.ranges: list[tuple[int | None, bool]] = []
+        self.stalled = Event()
+        self.release = Event()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/clip.mp4"
+
+
+def make_clip(path: str):
+    """Encode a clip of about `SIZE` bytes with ffmpeg."""
+    import subprocess
+
+    subprocess.run(
+        [
+            "ffmpeg", "-v", "error", "-y",
+            "-f", "lavfi", "-i", "testsrc=size=320x240:rate=25",
+            "-f", "lavfi", "-i", "anullsrc",
+            "-t", "4", "-c:v", "mpeg4", "-b:v", "500k", "-c:a", "aac", "-shortest",
+            path,
+        ],
+        check=True,
+    )  # fmt: skip
+
+
+class ReleasingDownloader(Downloader):
+    """Releases the stalling server once a task is requeued."""
+
+    server: StallingServer
+
+    def _download_task(self, task, attempt=0, workdir=None):
+        if attempt:
+            self.server.release.set()
+        super()._download_task(task, attempt, workdir)
+
+
+@unittest.skipUnless(shutil.which("ffmpeg"), "ffmpeg is not installed")
+class StallTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        clip = os.path.join(self.dir, "clip.mp4")
+        make_clip(clip)
+        with open(clip, "rb") as f:
+            self.data = f.read()
+        os.remove(clip)
+
+        self.server = StallingServer(self.data)
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.addCleanup(self.server.release.set)
+
+        self.out = os.path.join(self.dir, "out")
+        self.scratch = os.path.join(self.dir, "scratch")
+        archive = os.path.join(self.dir, "archive.db")
+        for patch in (
+            mock.patch.object(helpers, "Archive", lambda: Archive(archive)),
+            # Requeued tasks are retried right away
+            mock.patch.object(helpers, "REQUEUE_BACKOFF", 0),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def download(self, requeues: int) -> ReleasingDownloader:
+        options = DownloadOptions(
+            temp_dir=self.scratch,
+            stall_timeout=2,
+            requeues=requeues,
+            quality=Quality("fast"),
+            sink=LocalSink(self.out),
+            cache_dir=os.path.join(self.dir, "cache"),
+            preflight=False,
+            lookahead=0,
+        )
+        # Given as extracted info, so the server only sees the transfers
+        info = {
+            "id": "clip",
+            "title": "clip",
+            "url": self.server.url,
+            "ext": "mp4",
+            "webpage_url": self.server.url,
+            "extractor": "generic",
+            "extractor_key": "Generic",
+        }
+        task = DownloadTaskSchema(query=self.server.url, title="clip", info=info)
+        downloader = ReleasingDownloader(task, threads=1, options=options)
+        downloader.server = self.server
+        try:
+            downloader.download()
+        except SystemExit:
+            pass
+        return downloader
+
+    def test_stalled_transfer_resumes(self):
+        downloader = self.download(requeues=1)
+        self.assertTrue(self.server.stalled.is_set())
+        self.assertEqual(downloader.failures, 0)
+        # The requeued attempt extracts the URL again, then picks the transfer up where the
+        # stalled one left off
+        requeued = [start for start, released in self.server.ranges if released]
+        self.assertEqual(requeued[-1], STALL_AT, self.server.ranges)
+        self.assertTrue(os.path.isfile(os.path.join(self.out, "clip.mp4")))
+        self.assertEqual(os.listdir(self.scratch), [])
+
+    def test_gives_up_after_requeues(self):
+        self.download(requeues=0)
+        self.assertTrue(self.server.stalled.is_set())
+        self.assertFalse(self.server.release.is_set())
+        self.assertFalse(os.path.exists(os.path.join(self.out, "clip.mp4")))
+        # The scratch files of a task that was given up on are removed
+        self.assertEqual(os.listdir(self.scratch), [])
+
+
+if __name__ == "__main__":
+    unittest.main()